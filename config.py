@@ -21,6 +21,17 @@ DEFAULT_OUTPUT_EXTENSION = ".mp4"
 SERVER_HOST = "localhost"
 SERVER_PORT = 26519
 SERVER_PROTOCOL = "http"
+SERVER_CACHE_MAX_AGE = 3600  # Seconds the browser may reuse player files without revalidating
+SERVER_CACHE_MAX_FILE_SIZE = 16 * 1024 * 1024  # Largest file --server-cache keeps in memory (larger ones are sent with sendfile)
+SERVER_CACHE_MAX_SIZE = 512 * 1024 * 1024  # Memory --server-cache may use in total
+
+# Caching proxy (--proxy-cache)
+PROXY_CACHE_MAX_SIZE = 2 * 1024 * 1024 * 1024  # Disk space for cached assets, least recently used ones are evicted first
+PROXY_CACHE_RULES = [  # (host, path prefix) of immutable assets worth caching
+    ("flashthemes.net", "/static/"),
+    ("lightspeed.flashthemes.net", "/static/"),
+]
+PROXY_TIMEOUT = 30  # Seconds to wait for a remote host
 
 # OBS Server
 OBS_SERVER_HOST = "localhost"
@@ -28,6 +39,75 @@ OBS_SERVER_PORT = 4455
 OBS_SERVER_PASSWORD = ""
 OBS_FPS = 60
 
+# Native Capture
+# post:   capture losslessly, then re-encode to the final format once capture stops
+# direct: encode to the final format while capturing, then remux into the output container
+# pipeline: capture losslessly while a second FFmpeg process encodes the growing capture
+# segmented: capture losslessly in fixed-length segments that are encoded in parallel as they close
+AVAILABLE_ENCODE_MODES = [
+    "post",
+    "direct",
+    "pipeline",
+    "segmented",
+]
+DEFAULT_ENCODE_MODE = "post"
+DIRECT_ENCODE_PRESET = "veryfast"
+DIRECT_ENCODE_CRF = 23
+PIPELINE_TAIL_TIMEOUT = 5  # Seconds without new capture data before the pipeline encoder finishes
+SEGMENT_DURATION = 10  # Seconds per capture segment
+SEGMENT_ENCODE_WORKERS = 0  # Parallel segment encoders (0 = half the logical CPUs)
+RING_SEGMENT_DURATION = 2  # Seconds per ring buffer segment (--ring-buffer)
+RING_BUFFER_DURATION = 60  # Seconds of capture the ring buffer keeps before the current recording
+# Codec of the lossless capture stage (not used in direct mode)
+# auto:     x264 while it keeps up, otherwise the cheapest codec the disk can keep up with
+# x264:     libx264 lossless, smallest files but the most CPU per frame
+# ffv1:     FFV1 intra-only with slices, multi-threaded and about a third the CPU of x264
+# utvideo:  Ut Video, very cheap to encode, roughly half the size of uncompressed video
+# rawvideo: uncompressed, no CPU cost but needs a fast disk (about 90 MB/s at 1080p30)
+AVAILABLE_RAW_CODECS = [
+    "auto",
+    "x264",
+    "ffv1",
+    "utvideo",
+    "rawvideo",
+]
+DEFAULT_RAW_CODEC = "auto"
+RAW_CODEC_X264_MAX_PIXELS = 1920 * 1080  # Largest capture x264 is assumed to keep up with when there is no benchmark
+RAW_CODEC_DISK_HEADROOM = 2  # Disk bandwidth needed as a multiple of the capture data rate
+RAW_DISK_TEST_SIZE = 256 * 1024 * 1024  # Bytes written to measure disk bandwidth
+RAW_FFV1_SLICES = 16
+
+# Offline Render (--capture-backend offline)
+OFFLINE_FPS = 24  # Frames rendered per second of movie
+OFFLINE_QUEUE_SIZE = 48  # Grabbed frames waiting for the encoder
+OFFLINE_AUDIO = True  # Play the movie once more to record its sound (real time, audio only)
+
+# Screencast Capture (--capture-backend screencast)
+SCREENCAST_FPS = 30  # Frame rate of the capture, painted frames are repeated until the next one
+SCREENCAST_QUALITY = 90  # JPEG quality of the frames sent by the browser
+SCREENCAST_DELAY = 0.25  # Seconds frames may take to arrive before the previous frame is repeated in their place
+SCREENCAST_START_TIMEOUT = 10  # Seconds to wait for the first frame
+SCREENCAST_STOP_TIMEOUT = 60  # Seconds to wait for the encoder to finish
+
+# Encoder Benchmark (--benchmark)
+BENCHMARK_DURATION = 3  # Seconds of synthetic video encoded per measurement
+BENCHMARK_FPS = 30
+BENCHMARK_REALTIME_MARGIN = 1.25  # Required speed over real time, leaves headroom for the browser
+BENCHMARK_CAPTURE_PRESETS = ["ultrafast", "superfast", "veryfast"]  # Fast to slow
+BENCHMARK_ENCODE_PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium"]  # Fast to slow
+
+# Parallel Workers (--workers, Linux only)
+WORKER_DISPLAY_BASE = 90  # Worker displays are :90, :91, ...
+WORKER_DISPLAY_SIZE = (3840, 2160)  # Must fit the largest resolution exported by the workers
+WORKER_DISPLAY_DEPTH = 24
+SPLIT_OVERLAP = 2  # Seconds each part of a split export (--split) records past its range, cut when the part is edited
+SPLIT_TOLERANCE = 0.1  # Seconds a part may fall short of its range before the split export fails
+
+# Browser Audio Sinks (Linux only)
+# Every browser plays into its own PulseAudio null sink and capture records only its monitor,
+# so nothing else playing on the machine ends up in the export. Not used with --pulse-audio or OBS.
+BROWSER_AUDIO_SINK = True
+
 # Wrapper Server
 WRAPPER_SERVER_HOST = "127.0.0.1"
 WRAPPER_SERVER_PORT = 4343
@@ -97,7 +177,7 @@ AVAILABLE_SERVICES = {
             f"{WRAPPER_SERVER_PROTOCOL}://{WRAPPER_SERVER_HOST}:{WRAPPER_SERVER_PORT}",
         ],
         "player": [
-            f"{SERVER_PROTOCOL}://{SERVER_HOST}:{SERVER_PORT}",
+            f"{SERVER_PROTOCOL}://{SERVER_HOST}:{{server_port}}",  # Filled in per export, see --server-port
             (
                 "index.html?"
                 "environment=local"
@@ -125,7 +205,7 @@ AVAILABLE_SERVICES = {
             f"{WRAPPER_SERVER_PROTOCOL}://{WRAPPER_SERVER_HOST}:{WRAPPER_SERVER_PORT}",
         ],
         "player": [
-            f"{SERVER_PROTOCOL}://{SERVER_HOST}:{SERVER_PORT}",
+            f"{SERVER_PROTOCOL}://{SERVER_HOST}:{{server_port}}",  # Filled in per export, see --server-port
             (
                 "index.html?"
                 "environment=local"
@@ -246,7 +326,24 @@ PATH_FLASH_VERSION_LINUX = "34.0.0.137"
 # Data
 UPDATE_CHECK_INTERVAL = 60 * 1000  # 1 minute in milliseconds
 PATH_DATA_FILE = ["data.json"]
+DATA_FILE_LOCK_TIMEOUT = 10  # Seconds to wait for another export to finish writing data.json before taking over its lock
+PATH_OUTRO_CACHE = [DEFAULT_OUTPUT_FILENAME, "outro_cache"]  # Outros transcoded to match the capture
+OUTRO_CACHE_MAX_ENTRIES = 16  # Transcoded outros kept, least recently used are removed first
+SMART_TRIM_CHECK_DURATION = 2  # Seconds around a stream-copied join (smart trim, outro) that are test-decoded
+PATH_PROXY_CACHE = [DEFAULT_OUTPUT_FILENAME, "proxy_cache"]  # Remote assets kept by --proxy-cache
 BROWSER_NAME = "Chromium"
+BROWSER_POOL_SIZE = 1  # Warm browsers kept between batch exports (idle kiosk windows share the captured screen, keep this at 1)
+FLASH_PRESEED = True  # Allow Flash in the browser profile before launch instead of through the settings page
+FLASH_CHECK_TIMEOUT = 5  # Seconds to wait for a preseeded Flash player before falling back to the settings page
+PLAYER_EVENT_CHECK_INTERVAL = 5  # Seconds between checks of the page while waiting for a pushed start/stop event
+SYNC_MARKER = True  # Flash a white marker when the video starts and trim the recording to it
+SYNC_MARKER_DURATION = 200  # How long the marker is shown (ms), long enough for a few captured frames
+SYNC_SEARCH_WINDOW = 3  # Seconds around the estimated start to search for the marker
+SYNC_MARKER_TOLERANCE = 50  # How far (ms) a white run may be from SYNC_MARKER_DURATION to count as the marker
+AUTO_TRIM_WINDOW = 15  # Seconds scanned at each end of a recording by --auto-trim
+AUTO_TRIM_BLACK_THRESHOLD = 0.10  # Pixel luma (0-1) below which a pixel counts as black
+AUTO_TRIM_SILENCE_THRESHOLD = "-50dB"  # Audio level below which a sample counts as silent
+AUTO_TRIM_MIN_DURATION = 0.1  # Shortest black or silent stretch (s) that is trimmed
 
 # Development Settings
 DEBUG_MODE = False
@@ -12,6 +12,9 @@ import subprocess
 import time
 import requests
 import shlex
+import tempfile
+import threading
+from contextlib import contextmanager
 from rich import print
 from typing import Any, Callable
 from modules.logger import logger
@@ -33,30 +36,76 @@ def set_param(key: str, value):
     logger.debug(f"set_param() key={key}, value={value}")
 
 # Save management functions
+_save_lock = threading.Lock()
+
+@contextmanager
+def _data_file_lock(data_file_path: str):
+    """
+    Hold data.json for a read-modify-write, across threads and processes (parallel workers).
+    The lock is a file created exclusively next to data.json; one left behind by a crashed
+    process is taken over after DATA_FILE_LOCK_TIMEOUT seconds.
+    """
+    lock_path = data_file_path + ".lock"
+    timeout = get_config("DATA_FILE_LOCK_TIMEOUT")
+    with _save_lock:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                if time.time() > deadline:
+                    logger.warning(f"Taking over the stale lock {lock_path}")
+                    break
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
 def save(key: str, value):
     """
     Save a value to a key in the data.json file
+    The file is replaced atomically under a lock, so parallel exports never see it half-written
+    or overwrite each other's keys.
     :param key: The key to save the value under.
     :param value: The value to save.
+    :return: True if the value was saved, False otherwise.
     """
     logger.debug(f"save() called with key={key}, value={value}")
-    # Load existing data or initialize as empty dict
     data_file_path = get_path(get_app_folder(), get_config("PATH_DATA_FILE")[0])
-    if os.path.exists(data_file_path):
-        with open(data_file_path, "r") as f:
+    with _data_file_lock(data_file_path):
+        # Load existing data or initialize as empty dict
+        if os.path.exists(data_file_path):
+            with open(data_file_path, "r") as f:
+                try:
+                    data = json.load(f)
+                    logger.debug(f"Loaded existing data.json: {data}")
+                except json.JSONDecodeError as e:
+                    # Writing now would replace every other key with this one
+                    logger.error(f"Could not save {key}, {data_file_path} is not valid JSON: {e}")
+                    return False
+        else:
+            logger.debug(f"data.json not found at {data_file_path}, initializing empty dict.")
+            data = {}
+        data[key] = value
+        handle, temp_path = tempfile.mkstemp(prefix="data_", suffix=".tmp", dir=os.path.dirname(data_file_path))
+        try:
+            with os.fdopen(handle, "w") as f:
+                json.dump(data, f, indent=4)
+            os.replace(temp_path, data_file_path)
+        except OSError as e:
+            logger.error(f"Could not save {key} to {data_file_path}: {e}")
             try:
-                data = json.load(f)
-                logger.debug(f"Loaded existing data.json: {data}")
-            except json.JSONDecodeError:
-                logger.debug(f"JSON decode error in {data_file_path}, initializing empty dict.")
-                data = {}
-    else:
-        logger.debug(f"data.json not found at {data_file_path}, initializing empty dict.")
-        data = {}
-    data[key] = value
-    with open(data_file_path, "w") as f:
-        json.dump(data, f, indent=4)
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
         logger.debug(f"Saved data.json: {data}")
+        return True
 
 def load(key: str, default=False):
     """
@@ -771,7 +820,175 @@ def is_dll_loadable(dll_path):
         logger.debug(f"is_dll_loadable() DLL not loadable: {dll_path}")
         return False  # DLL not found or not registered
 
-def encode_video(input_path: str, output_path: str, width: int = None, height: int = None, crf: int = 23, preset: str = "medium"):
+def get_ffmpeg_path():
+    """
+    Get the path to the bundled FFmpeg executable for the current OS.
+    :return: Full path to FFmpeg, or None if the OS is unsupported.
+    """
+    if os_is_windows():
+        return get_path(get_app_folder(), get_config("PATH_FFMPEG_WINDOWS"))
+    elif os_is_linux():
+        return get_path(get_app_folder(), get_config("PATH_FFMPEG_LINUX"))
+    logger.debug("get_ffmpeg_path() unsupported OS")
+    return None
+
+def get_ffprobe_path():
+    """
+    Get the path to the bundled FFprobe executable for the current OS.
+    :return: Full path to FFprobe, or None if the OS is unsupported.
+    """
+    if os_is_windows():
+        return get_path(get_app_folder(), get_config("PATH_FFPROBE_WINDOWS"))
+    elif os_is_linux():
+        return get_path(get_app_folder(), get_config("PATH_FFPROBE_LINUX"))
+    logger.debug("get_ffprobe_path() unsupported OS")
+    return None
+
+def get_pulse_source(monitor: str | None = None):
+    """
+    Get the PulseAudio source Linux capture records from.
+    :param monitor: Monitor of the sink the browser plays into, if it has its own.
+    :return: The --pulse-audio parameter if set, else the monitor, else the monitor of the default output.
+    """
+    return get_param("pulse_audio") or monitor or "alsa_output.pci-0000_00_1b.0.analog-stereo.monitor"
+
+def get_audio_input(monitor: str | None = None):
+    """
+    Get the FFmpeg input options of the system audio source native capture records from.
+    :param monitor: Monitor of the sink the browser plays into, if it has its own (Linux only).
+    :return: List of FFmpeg options, or None if the OS is unsupported.
+    """
+    if os_is_windows():
+        return ["-f", "dshow", "-i", "audio=virtual-audio-capturer"]
+    elif os_is_linux():
+        return ["-f", "pulse", "-i", get_pulse_source(monitor)]
+    logger.debug("get_audio_input() unsupported OS")
+    return None
+
+def remux_video(input_path: str, output_path: str):
+    """
+    Copy the streams of a video file into a new container without re-encoding.
+    Used when the capture already produced the final codecs and only the container needs to change.
+
+    :param input_path: Path to the input video file.
+    :param output_path: Path to the output video file.
+    :return: True if remuxing succeeded, False otherwise.
+    """
+    try:
+        logger.info(f"Starting video remux: {input_path} -> {output_path}")
+        ffmpeg_path = get_ffmpeg_path()
+        if not ffmpeg_path:
+            logger.error("Unsupported OS for video remuxing")
+            return False
+
+        command = [
+            ffmpeg_path, "-y",
+            "-i", input_path,
+            "-map", "0",
+            "-c", "copy",
+            "-movflags", "+faststart",
+            output_path,
+        ]
+        logger.debug(f"remux_video() command: {' '.join(command)}")
+
+        result = create_logged_run(
+            command,
+            process_name="ffmpeg_remux",
+            cwd=get_cwd(),
+            capture_output=True,
+            text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if os_is_windows() else 0,
+        )
+
+        if result.returncode == 0:
+            logger.info(f"Video remux completed successfully: {output_path}")
+            return True
+        else:
+            logger.error(f"Video remux failed with return code {result.returncode}")
+            logger.error(f"FFmpeg stderr: {result.stderr}")
+            return False
+    except Exception as e:
+        logger.error(f"Error remuxing video: {e}")
+        return False
+
+def build_encode_command(input_path: str, output_path: str, width: int = None, height: int = None, crf: int = 23, preset: str = "medium", input_args: list = None, output_args: list = None):
+    """
+    Build the FFmpeg command used to encode a capture to the final output format.
+    Honours --ffmpeg-encode-override and --ffmpeg-encode-args.
+
+    :param input_path: Path to the input video file (raw capture).
+    :param output_path: Path to the output video file (encoded).
+    :param width: Optional width for cropping/scaling. If None, uses input dimensions.
+    :param height: Optional height for cropping/scaling. If None, uses input dimensions.
+    :param crf: Constant Rate Factor for quality (0-51, lower is better, 23 is default).
+    :param preset: Encoding preset (ultrafast, superfast, veryfast, faster, fast, medium, slow, slower, veryslow).
+    :param input_args: Optional FFmpeg options placed before the input (ignored by override commands).
+    :param output_args: Optional FFmpeg options placed after the encoding parameters (ignored by override commands).
+    :return: The command as a list, or None if the OS is unsupported.
+    """
+    # Check for command override first
+    ffmpeg_encode_override = get_param("ffmpeg_encode_override")
+    
+    if ffmpeg_encode_override:
+        # User provided a complete override command
+        logger.info("Using FFmpeg encode override command")
+        
+        # Handle both string and list overrides
+        if isinstance(ffmpeg_encode_override, str):
+            # Replace {input} and {output} placeholders with actual paths FIRST using str.format()
+            override_string = ffmpeg_encode_override.format(
+                input=input_path,
+                output=output_path
+            )
+            # Parse the override string into a list AFTER replacement
+            return shlex.split(override_string)
+        # Already a list, format each element
+        return [
+            arg.format(input=input_path, output=output_path)
+            for arg in ffmpeg_encode_override
+        ]
+
+    # Build FFmpeg command
+    ffmpeg_path = get_ffmpeg_path()
+    if not ffmpeg_path:
+        return None
+    
+    command = [ffmpeg_path, "-y"]
+    if input_args:
+        command.extend(input_args)
+    command.extend(["-i", input_path])
+    
+    # Add video filters if dimensions are specified
+    if width and height:
+        command.extend(["-vf", f"crop={width}:{height}:0:0,format=yuv420p"])
+    else:
+        command.extend(["-vf", "format=yuv420p"])
+    
+    # Add encoding parameters
+    command.extend([
+        "-c:v", "libx264",
+        "-preset", preset,
+        "-crf", str(crf),
+        "-pix_fmt", "yuv420p",
+        "-c:a", "aac",
+        "-b:a", "128k",
+        "-ar", "44100",
+    ])
+    if output_args:
+        command.extend(output_args)
+    
+    # Add custom arguments if provided
+    ffmpeg_encode_args = get_param("ffmpeg_encode_args")
+    if ffmpeg_encode_args:
+        logger.info(f"Adding custom encode FFmpeg arguments: {ffmpeg_encode_args}")
+        custom_args = shlex.split(ffmpeg_encode_args)
+        command.extend(custom_args)
+    
+    # Add output file at the end
+    command.append(output_path)
+    return command
+
+def encode_video(input_path: str, output_path: str, width: int = None, height: int = None, crf: int = 23, preset: str = "medium", output_args: list = None):
     """
     Encode a video file using FFmpeg with optimal settings for quality and compatibility.
     This function is designed to be called after raw video capture to produce the final output.
@@ -782,74 +999,16 @@ def encode_video(input_path: str, output_path: str, width: int = None, height: i
     :param height: Optional height for cropping/scaling. If None, uses input dimensions.
     :param crf: Constant Rate Factor for quality (0-51, lower is better, 23 is default).
     :param preset: Encoding preset (ultrafast, superfast, veryfast, faster, fast, medium, slow, slower, veryslow).
+    :param output_args: Optional FFmpeg options placed after the encoding parameters.
     :return: True if encoding succeeded, False otherwise.
     """
     try:
         logger.info(f"Starting video encoding: {input_path} -> {output_path}")
         
-        # Check for command override first
-        ffmpeg_encode_override = get_param("ffmpeg_encode_override")
-        
-        if ffmpeg_encode_override:
-            # User provided a complete override command
-            logger.info("Using FFmpeg encode override command")
-            
-            # Handle both string and list overrides
-            if isinstance(ffmpeg_encode_override, str):
-                # Replace {input} and {output} placeholders with actual paths FIRST using str.format()
-                override_string = ffmpeg_encode_override.format(
-                    input=input_path,
-                    output=output_path
-                )
-                # Parse the override string into a list AFTER replacement
-                command = shlex.split(override_string)
-            else:
-                # Already a list, format each element
-                command = [
-                    arg.format(input=input_path, output=output_path)
-                    for arg in ffmpeg_encode_override
-                ]
-        else:
-            # Build FFmpeg command
-            if os_is_windows():
-                ffmpeg_path = get_path(get_app_folder(), get_config("PATH_FFMPEG_WINDOWS"))
-            elif os_is_linux():
-                ffmpeg_path = get_path(get_app_folder(), get_config("PATH_FFMPEG_LINUX"))
-            else:
-                logger.error("Unsupported OS for video encoding")
-                return False
-            
-            command = [
-                ffmpeg_path, "-y",
-                "-i", input_path,
-            ]
-            
-            # Add video filters if dimensions are specified
-            if width and height:
-                command.extend(["-vf", f"crop={width}:{height}:0:0,format=yuv420p"])
-            else:
-                command.extend(["-vf", "format=yuv420p"])
-            
-            # Add encoding parameters
-            command.extend([
-                "-c:v", "libx264",
-                "-preset", preset,
-                "-crf", str(crf),
-                "-pix_fmt", "yuv420p",
-                "-c:a", "aac",
-                "-b:a", "128k",
-                "-ar", "44100",
-            ])
-            
-            # Add custom arguments if provided
-            ffmpeg_encode_args = get_param("ffmpeg_encode_args")
-            if ffmpeg_encode_args:
-                logger.info(f"Adding custom encode FFmpeg arguments: {ffmpeg_encode_args}")
-                custom_args = shlex.split(ffmpeg_encode_args)
-                command.extend(custom_args)
-            
-            # Add output file at the end
-            command.append(output_path)
+        command = build_encode_command(input_path, output_path, width, height, crf, preset, output_args=output_args)
+        if not command:
+            logger.error("Unsupported OS for video encoding")
+            return False
         
         logger.debug(f"encode_video() command: {' '.join(command)}")
         
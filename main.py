@@ -5,6 +5,10 @@ import builtins
 import helpers
 from modules.compatibility import Compatibility
 from modules.flow import Controller
+from modules import benchmark
+from modules.batch import Batch, read_manifest
+from modules.workers import WorkerPool
+from modules.split import Split
 from modules.logger import logger
 from modules.update import Update
 from modules.output import structured_output
@@ -56,9 +60,27 @@ def main():
             return False
         logger.info("You passed the compatibility check")
 
+        # Benchmark the encoder and exit
+        if helpers.get_param("benchmark"):
+            structured_output.progress("Benchmarking encoder settings", stage="benchmark")
+            if not benchmark.run():
+                structured_output.error("Failed to benchmark the encoder")
+                return False
+            structured_output.completed(message="Encoder profile saved")
+            return True
+
         # Welcome message
         welcome()
 
+        # Run every job in the batch manifest and exit
+        if helpers.get_param("batch"):
+            helpers.set_param("no_input", True)
+            structured_output.progress("Running batch", stage="batch")
+            jobs = read_manifest(helpers.get_param("batch"))
+            if (helpers.get_param("workers") or 0) > 1:
+                return WorkerPool(helpers.get_param("workers")).run(jobs)
+            return Batch(controller).run(jobs)
+
         # Check if no GUI is enabled
         if not helpers.has_console():
             # Set up Qt platform plugin debugging for Linux
@@ -91,7 +113,12 @@ def main():
                 return False
             
             structured_output.progress("Exporting video", stage="export")
-            if not controller.export():
+            if (helpers.get_param("split") or 0) > 1:
+                # Record parts of the movie on parallel workers
+                exported = Split(controller, helpers.get_param("split")).run()
+            else:
+                exported = controller.export()
+            if not exported:
                 logger.fatal("Unable to export video")
                 structured_output.error("Failed to export video")
                 return False
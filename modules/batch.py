@@ -0,0 +1,153 @@
+# Batch export module
+# Runs many exports through one process, so startup costs are paid once instead of once per video
+
+import os
+import csv
+import sys
+import json
+import time
+import helpers
+from modules.logger import logger
+from modules.output import structured_output
+from modules.exceptions import TimeoutError
+
+# Manifest fields and the parameters they set for their job
+JOB_FIELDS = {
+    "service": "service",
+    "movie_id": "movie_id",
+    "owner_id": "owner_id",
+    "aspect_ratio": "aspect_ratio",
+    "resolution": "resolution",
+    "output_path": "output_path",
+    "use_outro": "use_outro",
+    # Time range of a split export part (--split)
+    "range_start": "range_start",
+    "range_end": "range_end",
+}
+
+def read_manifest(path: str):
+    """
+    Read the jobs of a batch manifest.
+    A manifest is a CSV file with a header row, a JSON file with a list of jobs
+    (or an object with a "jobs" list), or "-" to read one JSON job per line from
+    STDIN as they arrive.
+    :param path: Path to the manifest, or "-" for STDIN.
+    :return: Iterator of job dicts.
+    """
+    if path == "-":
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                logger.error(f"Invalid batch job on STDIN: {e}")
+        return
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if os.path.splitext(path)[1].lower() == ".csv":
+            # Empty cells mean "use the command-line value"
+            for row in csv.DictReader(f):
+                yield {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+            return
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("jobs", [])
+    yield from data
+
+class Batch:
+    """
+    Runs the jobs of a manifest one after another through a single Controller.
+    The compatibility check, the controller, the local server and the browser are
+    set up once and reused; fields a job leaves out keep their command-line values.
+    """
+    def __init__(self, controller):
+        self.controller = controller
+        # Parameters as given on the command line, restored before each job
+        self.defaults = {param: helpers.get_param(param) for param in JOB_FIELDS.values()}
+
+    def apply(self, job: dict):
+        """
+        Set the parameters of a job.
+        :param job: Job dict from the manifest.
+        """
+        for param, value in self.defaults.items():
+            helpers.set_param(param, value)
+        for field, value in job.items():
+            if field not in JOB_FIELDS:
+                logger.warning(f"Ignoring unknown batch field '{field}'")
+                continue
+            if field == "use_outro" and isinstance(value, str):
+                value = value.strip().lower() in ("1", "true", "yes", "y", "t")
+            helpers.set_param(JOB_FIELDS[field], value)
+
+    def run_job(self, job: dict):
+        """
+        Run a single export.
+        :param job: Job dict from the manifest.
+        :return: Path of the exported video (or of the project folder without auto editing).
+        :raises RuntimeError: If a step of the export fails.
+        """
+        controller = self.controller
+        self.apply(job)
+        controller.reset()
+        controller.PROJECT_FOLDER = None
+
+        if not controller.setup():
+            raise RuntimeError("Failed to complete setup")
+        if not controller.export():
+            raise RuntimeError("Failed to export video")
+        if controller.auto_edit:
+            if not controller.final(helpers.get_param("use_outro")):
+                raise RuntimeError("Failed to finalize video")
+            return controller.RECORDING_EDITED
+        return controller.PROJECT_FOLDER
+
+    def run(self, jobs):
+        """
+        Run every job, reporting each one through the structured output.
+        :param jobs: Iterable of job dicts.
+        :return: True if every job succeeded, False otherwise.
+        """
+        self.controller.persistent = True
+        # Keep browsers running between jobs, and launch the first one while the batch starts
+        self.controller.browser.warm()
+        succeeded = failed = 0
+        try:
+            for index, job in enumerate(jobs):
+                job_id = job.get("id", index) if isinstance(job, dict) else index
+                if not isinstance(job, dict):
+                    logger.error(f"Batch job {job_id} is not an object: {job}")
+                    structured_output.emit("job_failed", job_id=job_id, message="Invalid job")
+                    failed += 1
+                    continue
+                job = {key: value for key, value in job.items() if key != "id"}
+                logger.info(f"Starting batch job {job_id}: {job}")
+                structured_output.emit("job_started", job, job_id=job_id)
+                started = time.time()
+                try:
+                    output_path = self.run_job(job)
+                except TimeoutError as e:
+                    logger.error(f"Batch job {job_id} timed out: {e.message}")
+                    structured_output.emit("job_skipped", job_id=job_id, reason=e.message, timeout_type=e.timeout_type)
+                    self.controller.abort()
+                    failed += 1
+                    continue
+                except Exception as e:
+                    logger.error(f"Batch job {job_id} failed: {e}")
+                    structured_output.emit("job_failed", job_id=job_id, message=str(e))
+                    self.controller.abort()
+                    failed += 1
+                    continue
+                succeeded += 1
+                logger.info(f"Batch job {job_id} finished: {output_path}")
+                structured_output.emit("job_completed", job_id=job_id, output_path=output_path, duration=round(time.time() - started, 3))
+        finally:
+            self.controller.persistent = False
+            self.controller.stop_server()
+            self.controller.browser.shutdown()
+
+        logger.info(f"Batch finished: {succeeded} succeeded, {failed} failed")
+        structured_output.emit("batch_completed", succeeded=succeeded, failed=failed)
+        return failed == 0
@@ -0,0 +1,218 @@
+# Encoder benchmark module
+# Measures which x264 settings keep up with real time on this machine and stores the best profile
+
+import os
+import time
+import tempfile
+import subprocess
+import helpers
+from rich import print
+from modules.logger import logger
+from modules.output import structured_output
+
+# Capture and encode stages, with the presets each stage tries
+STAGES = {
+    # Lossless intermediate written while capturing
+    "capture": {"presets_config": "BENCHMARK_CAPTURE_PRESETS"},
+    # Final encode, either while capturing (direct/pipeline) or afterwards
+    "encode": {"presets_config": "BENCHMARK_ENCODE_PRESETS"},
+}
+
+def get_sizes():
+    """
+    Get every capture size configured in AVAILABLE_SIZES.
+    :return: Sorted list of unique (width, height) tuples, smallest first.
+    """
+    sizes = set()
+    for resolutions in helpers.get_config("AVAILABLE_SIZES").values():
+        for width, height, *_ in resolutions.values():
+            sizes.add((width, height))
+    return sorted(sizes, key=lambda size: size[0] * size[1])
+
+def get_thread_counts():
+    """
+    Get the x264 thread counts to try.
+    :return: Sorted list of thread counts.
+    """
+    cpus = os.cpu_count() or 1
+    return sorted({max(1, cpus // 4), max(1, cpus // 2), cpus})
+
+def get_command(stage: str, width: int, height: int, preset: str, threads: int, output: str):
+    """
+    Build the command a stage runs, with a synthetic clip as its input.
+    The options are the ones native capture and helpers.build_encode_command use.
+    :param stage: "capture" or "encode".
+    :param width: Width of the clip.
+    :param height: Height of the clip.
+    :param preset: x264 preset.
+    :param threads: x264 thread count.
+    :param output: Path of the encoded clip.
+    :return: The command as a list, or None if it cannot be built.
+    """
+    duration = helpers.get_config("BENCHMARK_DURATION")
+    fps = helpers.get_config("BENCHMARK_FPS")
+    video = f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}"
+    audio = f"sine=frequency=1000:sample_rate=44100:duration={duration}"
+    if stage == "capture":
+        # x264 raw codec of native capture (see Capture.get_codec_settings)
+        return [
+            helpers.get_ffmpeg_path(), "-y",
+            "-f", "lavfi", "-i", video,
+            "-f", "lavfi", "-i", audio,
+            "-c:v", "libx264",
+            "-preset", preset,
+            "-crf", "0",
+            "-tune", "zerolatency",
+            "-threads", str(threads),
+            "-pix_fmt", "yuv420p",
+            "-c:a", "pcm_s16le",
+            "-ar", "44100",
+            output,
+        ]
+    return helpers.build_encode_command(
+        input_path=video,
+        output_path=output,
+        width=width,
+        height=height,
+        preset=preset,
+        input_args=["-f", "lavfi", "-i", audio, "-f", "lavfi"],
+        output_args=["-threads", str(threads)],
+    )
+
+def measure(stage: str, width: int, height: int, preset: str, threads: int):
+    """
+    Run a stage on a synthetic clip and measure the encoding speed.
+    :param stage: "capture" or "encode".
+    :param width: Width of the clip.
+    :param height: Height of the clip.
+    :param preset: x264 preset.
+    :param threads: x264 thread count.
+    :return: Dict with "fps", "speed" (multiple of real time) and "size" (bytes per second of video), or None on failure.
+    """
+    duration = helpers.get_config("BENCHMARK_DURATION")
+    fps = helpers.get_config("BENCHMARK_FPS")
+    handle, output = tempfile.mkstemp(suffix=".mkv" if stage == "capture" else ".mp4", prefix="goexport_benchmark_")
+    os.close(handle)
+    command = get_command(stage, width, height, preset, threads, output)
+    if not command:
+        os.remove(output)
+        return None
+    try:
+        started = time.perf_counter()
+        result = helpers.create_logged_run(
+            command,
+            log_output=False,
+            capture_output=True,
+            text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0
+        )
+        elapsed = time.perf_counter() - started
+        if result.returncode != 0:
+            logger.error(f"Benchmark encode failed: {result.stderr.strip()}")
+            return None
+        size = os.path.getsize(output)
+    except Exception as e:
+        logger.error(f"Benchmark encode failed: {e}")
+        return None
+    finally:
+        try:
+            os.remove(output)
+        except OSError:
+            pass
+
+    encoded_fps = duration * fps / elapsed
+    return {
+        "fps": round(encoded_fps, 1),
+        "speed": round(encoded_fps / fps, 2),
+        "size": int(size / duration),
+    }
+
+def pick(results: list):
+    """
+    Pick the best result: the smallest output among the settings that keep up with real time,
+    or the fastest settings if none of them do.
+    :param results: List of result dicts with "preset", "threads", "fps", "speed" and "size".
+    :return: The best result, or None if there are no results.
+    """
+    if not results:
+        return None
+    margin = helpers.get_config("BENCHMARK_REALTIME_MARGIN")
+    realtime = [r for r in results if r["speed"] >= margin]
+    if realtime:
+        return min(realtime, key=lambda r: (r["size"], -r["fps"]))
+    logger.warning("No settings keep up with real time, using the fastest ones")
+    return max(results, key=lambda r: r["fps"])
+
+def run():
+    """
+    Benchmark every stage at every configured size and store the best profile.
+    :return: True if a profile was stored, False otherwise.
+    """
+    if not helpers.get_ffmpeg_path():
+        logger.error("Unsupported OS for benchmarking")
+        return False
+
+    profile = {
+        "version": helpers.get_config("APP_VERSION"),
+        "cpu_count": os.cpu_count(),
+        "sizes": {},
+    }
+    threads = get_thread_counts()
+    margin = helpers.get_config("BENCHMARK_REALTIME_MARGIN")
+    for width, height in get_sizes():
+        entry = {}
+        for stage, settings in STAGES.items():
+            structured_output.progress(f"Benchmarking {stage} at {width}x{height}", stage="benchmark")
+            results = []
+            # Presets are ordered fast to slow, once one is too slow the slower ones are too
+            for preset in helpers.get_config(settings["presets_config"]):
+                measured = []
+                for count in threads:
+                    result = measure(stage, width, height, preset, count)
+                    if result:
+                        result.update(preset=preset, threads=count)
+                        measured.append(result)
+                        logger.info(f"{stage} {width}x{height} {preset} threads={count}: {result['fps']} fps ({result['speed']}x)")
+                results.extend(measured)
+                if not any(r["speed"] >= margin for r in measured):
+                    break
+            best = pick(results)
+            if best:
+                entry[stage] = best
+                print(f"[green]{width}x{height} {stage}: [bold]{best['preset']}[/bold], {best['threads']} threads ({best['speed']}x real time)")
+        if entry:
+            profile["sizes"][f"{width}x{height}"] = entry
+
+    if not profile["sizes"]:
+        logger.error("Benchmark produced no results")
+        return False
+    helpers.save("encoder_profile", profile)
+    logger.info("Encoder profile saved")
+    return True
+
+def get_profile(stage: str, width: int, height: int):
+    """
+    Get the benchmarked settings for a stage at a capture size.
+    Sizes that were not measured use the next larger measured size.
+    :param stage: "capture" or "encode".
+    :param width: Width of the capture.
+    :param height: Height of the capture.
+    :return: Dict with "preset" and "threads", or None if there is no usable profile.
+    """
+    profile = helpers.load("encoder_profile", None)
+    if not profile or profile.get("cpu_count") != os.cpu_count():
+        # Measured on other hardware
+        return None
+    if profile.get("version") != helpers.get_config("APP_VERSION"):
+        # Other versions may encode with other options
+        return None
+    candidates = []
+    for size, entry in profile.get("sizes", {}).items():
+        if stage not in entry:
+            continue
+        measured_width, measured_height = (int(n) for n in size.split("x"))
+        if measured_width * measured_height >= width * height:
+            candidates.append((measured_width * measured_height, entry[stage]))
+    if not candidates:
+        return None
+    return min(candidates, key=lambda c: c[0])[1]
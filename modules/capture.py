@@ -2,6 +2,7 @@ import helpers
 from modules.logger import logger
 from modules.obs_capture import Capture as ObsCapture
 from modules.native_capture import Capture as NativeCapture
+from modules.screencast_capture import Capture as ScreencastCapture
 
 class Capture:
     def __init__(self):
@@ -13,7 +14,13 @@ class Capture:
         self.filename = None
         self.obs = ObsCapture()
         self.native = NativeCapture()
+        # Created once the browser is known (see attach)
+        self.screencast = None
+        self.is_screencast = helpers.get_param("capture_backend") == "screencast"
         self.is_obs = False
+        if self.is_screencast:
+            # The browser is captured directly, OBS is not needed
+            return
         if not self.is_obs and helpers.get_param("obs_required"):
             logger.fatal("OBS connection is required but could not be established.")
             raise Exception("OBS connection is required but could not be established.")
@@ -25,23 +32,30 @@ class Capture:
         except Exception as e:
             logger.error(f"Failed to connect to OBS WebSocket server: {e}")
 
+    def attach(self, browser):
+        """Set the browser that is captured, and whose audio sink native capture records."""
+        self.native.browser = browser
+        if self.is_screencast:
+            self.screencast = ScreencastCapture(browser)
+
     def retrieve(self):
         if self.is_obs:
-            self.filename = self.obs.filename
-            self.start_time = self.obs.start_time
-            self.end_time = self.obs.end_time
-            self.startup_delay = self.obs.startup_delay
-            self.ended_delay = self.obs.ended_delay
+            source = self.obs
+        elif self.is_screencast:
+            source = self.screencast
         else:
-            self.filename = self.native.filename
-            self.start_time = self.native.start_time
-            self.end_time = self.native.end_time
-            self.startup_delay = self.native.startup_delay
-            self.ended_delay = self.native.ended_delay
+            source = self.native
+        self.filename = source.filename
+        self.start_time = source.start_time
+        self.end_time = source.end_time
+        self.startup_delay = source.startup_delay
+        self.ended_delay = source.ended_delay
 
     def start(self, output: str, width: int, height: int, window: str):
         if self.is_obs:
             object = self.obs.start(width, height, window)
+        elif self.is_screencast:
+            object = self.screencast.start(output, width, height)
         else:
             object = self.native.start(output, width, height)
         self.retrieve()
@@ -51,5 +65,7 @@ class Capture:
         self.retrieve()
         if self.is_obs:
             return self.obs.stop()
+        elif self.is_screencast:
+            return self.screencast.stop()
         else:
             return self.native.stop()
\ No newline at end of file
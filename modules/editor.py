@@ -1,4 +1,27 @@
+import os
+import re
+import json
+import hashlib
+import subprocess
+from fractions import Fraction
 import helpers
+from modules import probe
+
+# ffprobe H.264 profile names and the matching libx264 -profile:v values
+X264_PROFILES = {
+    "Constrained Baseline": "baseline",
+    "Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+    "High 10": "high10",
+    "High 4:2:2": "high422",
+    "High 4:4:4 Predictive": "high444",
+}
+
+# blackdetect/silencedetect output lines
+BLACK_LINE = re.compile(r"black_start:([\d.]+)\s+black_end:([\d.]+)")
+SILENCE_START_LINE = re.compile(r"silence_start:\s*(-?[\d.]+)")
+SILENCE_END_LINE = re.compile(r"silence_end:\s*([\d.]+)")
 
 class Editor:
     """
@@ -7,10 +30,16 @@ class Editor:
     to manipulate video clips. This is to ensure better performance and
     compatibility across different systems.
     The module will allow for adding clips, trimming them, and rendering.
+
+    In lazy mode, trims are only recorded in an edit list of in/out points and
+    applied by the render itself, so every clip is read and encoded once.
     """
-    def __init__(self):
+    def __init__(self, lazy: bool = False):
         # List of video clip locations
         self.clips = []
+        # In/out points (start, end) per clip, None when the whole clip is used
+        self.ranges = []
+        self.lazy = lazy
     
     def get_clip_length(self, clip_id: int):
         """
@@ -20,29 +49,17 @@ class Editor:
         """
         if clip_id < 0 or clip_id >= len(self.clips):
             raise IndexError(f"Clip ID {clip_id} is out of range.")
+
+        # A lazily trimmed clip is as long as its edit
+        if self.ranges[clip_id]:
+            start, end = self.ranges[clip_id]
+            return end - start
         
         try:
-            if helpers.os_is_windows():
-                output = helpers.try_command(
-                    helpers.get_path(helpers.get_app_folder(), helpers.get_config("PATH_FFPROBE_WINDOWS")),
-                    "-v", "error",
-                    "-show_entries", "format=duration",
-                    "-of", "default=noprint_wrappers=1:nokey=1",
-                    self.clips[clip_id],
-                    return_output=True
-                )
-            elif helpers.os_is_linux():
-                output = helpers.try_command(
-                    helpers.get_path(helpers.get_app_folder(), helpers.get_config("PATH_FFPROBE_LINUX")),
-                    "-v", "error",
-                    "-show_entries", "format=duration",
-                    "-of", "default=noprint_wrappers=1:nokey=1",
-                    self.clips[clip_id],
-                    return_output=True
-                )
-            else:
-                raise NotImplementedError("Unsupported OS for getting clip length.")
-            return float(output)
+            duration = probe.get_duration(probe.probe(self.clips[clip_id]))
+            if duration is None:
+                raise ValueError("duration is unknown")
+            return duration
         except Exception as e:
             raise RuntimeError(f"Error getting length of clip {clip_id}: {e}")
     
@@ -51,6 +68,7 @@ class Editor:
         Reset the list of video clips.
         """
         self.clips = []
+        self.ranges = []
 
     def add_clip(self, path: str, position: int = -1):
         """
@@ -63,73 +81,603 @@ class Editor:
             raise FileNotFoundError(f"File not found: {path}")
         if position == -1:
             self.clips.append(path)
+            self.ranges.append(None)
         else:
             self.clips.insert(position, path)
+            self.ranges.insert(position, None)
 
         print(f"Clip added at position {position}: {path}")
         print(f"Current clips: {self.clips}")
         
-    def trim(self, clip_id: int, start: float, end: float):
+    def get_keyframes(self, clip_id: int, start: float, end: float):
         """
-        Trim a clip to the specified start and end times.
-        :param clip_id: ID of the clip to trim.
+        Get the timestamps of the video keyframes of a clip between two points.
+        Reads packet flags only, so nothing has to be decoded.
+        :param clip_id: ID of the clip to inspect.
         :param start: Start time in seconds.
         :param end: End time in seconds.
+        :return: Sorted list of keyframe timestamps in seconds.
+        """
+        output = helpers.try_command(
+            helpers.get_ffprobe_path(),
+            "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags",
+            "-of", "csv=p=0",
+            "-read_intervals", f"{start}%{end}",
+            self.clips[clip_id],
+            return_output=True
+        )
+        if not output:
+            return []
+        keyframes = []
+        for line in output.splitlines():
+            pts_time, _, flags = line.partition(",")
+            if "K" in flags and pts_time not in ("", "N/A"):
+                keyframes.append(float(pts_time))
+        return sorted(keyframes)
+
+    def scan_blank(self, clip_id: int, start: float, duration: float):
+        """
+        Find the black and silent stretches in part of a clip.
+        The video is decoded at a small size, so the scan runs well above real time.
+        :param clip_id: ID of the clip to scan.
+        :param start: Start of the scanned part in seconds (in the clip's file).
+        :param duration: Length of the scanned part in seconds.
+        :return: Dict with "video" and "audio" lists of (start, end) tuples relative to the scanned part;
+                 "audio" is None if the clip has no audio.
+        """
+        ffmpeg = helpers.get_ffmpeg_path()
+        if not ffmpeg:
+            raise NotImplementedError("Scanning is not implemented for this OS.")
+
+        path = self.clips[clip_id]
+        has_audio = probe.get_stream(probe.probe(path), "audio") is not None
+        minimum = helpers.get_config("AUTO_TRIM_MIN_DURATION")
+        command = [
+            ffmpeg,
+            "-hide_banner",
+            "-nostats",
+            "-ss", f"{start:.3f}",
+            "-t", f"{duration:.3f}",
+            "-i", path,
+            "-vf", f"scale=160:-2,blackdetect=d={minimum}:pix_th={helpers.get_config('AUTO_TRIM_BLACK_THRESHOLD')}",
+        ]
+        if has_audio:
+            command += ["-af", f"silencedetect=n={helpers.get_config('AUTO_TRIM_SILENCE_THRESHOLD')}:d={minimum}"]
+        command += ["-f", "null", "-"]
+
+        result = helpers.create_logged_run(
+            command,
+            log_output=False,
+            capture_output=True,
+            text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Error scanning clip {clip_id}: {result.stderr.strip()}")
+
+        video = [(float(a), float(b)) for a, b in BLACK_LINE.findall(result.stderr)]
+        audio = None
+        if has_audio:
+            audio = []
+            silence_start = None
+            for line in result.stderr.splitlines():
+                match = SILENCE_START_LINE.search(line)
+                if match:
+                    silence_start = max(0.0, float(match.group(1)))
+                    continue
+                match = SILENCE_END_LINE.search(line)
+                if match and silence_start is not None:
+                    audio.append((silence_start, float(match.group(1))))
+                    silence_start = None
+            if silence_start is not None:
+                # Silent up to the end of the scanned part
+                audio.append((silence_start, duration))
+        return {"video": video, "audio": audio}
+
+    def detect_content(self, clip_id: int):
+        """
+        Find where the content of a clip starts and ends, by skipping the black
+        picture and silence at both ends. A stretch only counts as blank if both
+        the picture is black and the audio is silent (or the clip has no audio).
+        Only AUTO_TRIM_WINDOW seconds at each end are scanned.
+        :param clip_id: ID of the clip to inspect.
+        :return: Tuple (start, end) in seconds relative to the clip as it is currently edited,
+                 or None if the clip seems to be blank.
         :raises IndexError: If the clip ID is out of range.
         """
         if clip_id < 0 or clip_id >= len(self.clips):
             raise IndexError(f"Clip ID {clip_id} is out of range.")
-        
-        if helpers.os_is_windows():
+
+        length = self.get_clip_length(clip_id)
+        offset = self.ranges[clip_id][0] if self.ranges[clip_id] else 0
+        window = min(helpers.get_config("AUTO_TRIM_WINDOW"), length)
+        # One frame of slack for the stretches touching either end
+        slack = 0.05
+
+        def leading(intervals):
+            if intervals is None:
+                return None
+            for start, end in intervals:
+                if start <= slack:
+                    return end
+            return 0.0
+
+        def trailing(intervals, scanned):
+            if intervals is None:
+                return None
+            for start, end in intervals:
+                if end >= scanned - slack:
+                    return start
+            return scanned
+
+        head = self.scan_blank(clip_id, offset, window)
+        if length <= window:
+            tail, tail_start = head, 0.0
+        else:
+            tail_start = length - window
+            tail = self.scan_blank(clip_id, offset + tail_start, window)
+
+        # The content starts where either the picture or the sound does
+        starts = [t for t in (leading(head["video"]), leading(head["audio"])) if t is not None]
+        ends = [t for t in (trailing(tail["video"], window), trailing(tail["audio"], window)) if t is not None]
+        start = min(starts)
+        end = tail_start + max(ends)
+        if end - start <= helpers.get_config("AUTO_TRIM_MIN_DURATION"):
+            print(f"Clip {clip_id} seems to be blank, not trimming it")
+            return None
+        print(f"Clip {clip_id} content: {start} - {end} of {length}")
+        return (start, end)
+
+    def auto_trim(self, clip_id: int):
+        """
+        Trim the black and silent stretches from both ends of a clip.
+        :param clip_id: ID of the clip to trim.
+        :return: True if the clip was trimmed, False if there was nothing to trim.
+        """
+        bounds = self.detect_content(clip_id)
+        if not bounds:
+            return False
+        start, end = bounds
+        if start <= 0 and end >= self.get_clip_length(clip_id):
+            return False
+        self.trim(clip_id, start, end)
+        return True
+
+    def get_stream_profile(self, clip_id: int):
+        """
+        Get the stream parameters of a clip that have to match for a stream-copy concat.
+        :param clip_id: ID of the clip to inspect.
+        :return: Dict with "video" and "audio" parameter tuples (None if the stream is missing),
+                 or None if the clip could not be probed.
+        """
+        return self.get_file_profile(self.clips[clip_id])
+
+    def get_file_profile(self, path: str):
+        """
+        Get the stream parameters of a video file.
+        Video: (codec_name, profile, width, height, pix_fmt, r_frame_rate, time_base)
+        Audio: (codec_name, sample_rate, channels)
+        :param path: Path to the video file.
+        :return: Dict with "video" and "audio" parameter tuples (None if the stream is missing),
+                 or None if the file could not be probed.
+        """
+        info = probe.probe(path)
+        if not info:
+            return None
+
+        profile = {"video": None, "audio": None}
+        for stream in info["streams"]:
+            kind = stream.get("codec_type")
+            if kind == "video" and profile["video"] is None:
+                profile["video"] = tuple(stream.get(key) for key in (
+                    "codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate", "time_base"
+                ))
+            elif kind == "audio" and profile["audio"] is None:
+                profile["audio"] = tuple(stream.get(key) for key in (
+                    "codec_name", "sample_rate", "channels"
+                ))
+        return profile
+
+    def can_stream_copy(self, target_width: int, target_height: int, fps: int = 30):
+        """
+        Check whether all clips can be joined with the concat demuxer without re-encoding.
+        Every clip has to have a video and an audio stream with identical parameters,
+        and the video has to be at the target size and frame rate already.
+        :param target_width: Width of the rendered video.
+        :param target_height: Height of the rendered video.
+        :param fps: Frame rate of the rendered video.
+        :return: True if a stream-copy concat produces the same result as a re-encode.
+        """
+        # Probe all clips at once, the checks below then hit the probe cache
+        probe.probe_many(self.clips)
+        reference = None
+        for clip_id in range(len(self.clips)):
+            profile = self.get_stream_profile(clip_id)
+            if not profile or not profile["video"] or not profile["audio"]:
+                return False
+            width, height = profile["video"][2:4]
+            if (width, height) != (int(target_width), int(target_height)):
+                return False
+            if not self.has_frame_rate(profile["video"][5], fps):
+                return False
+            if reference is None:
+                reference = profile
+            elif profile != reference:
+                return False
+        return reference is not None
+
+    @staticmethod
+    def get_match_args(stream: dict):
+        """
+        Get the libx264 arguments that reproduce the H.264 parameters of a video stream,
+        so a new encode can be joined to it by stream copy.
+        :param stream: Video stream as reported by ffprobe.
+        :return: List of FFmpeg arguments, or None if the stream's profile cannot be reproduced.
+        """
+        x264_profile = X264_PROFILES.get(stream.get("profile"))
+        if not x264_profile:
+            return None
+        match_args = ["-profile:v", x264_profile, "-pix_fmt", stream.get("pix_fmt") or "yuv420p"]
+        if stream.get("level", -1) > 0:
+            match_args.extend(["-level:v", f"{stream['level'] / 10:.1f}"])
+        if stream.get("refs"):
+            match_args.extend(["-refs", str(stream["refs"])])
+        return match_args
+
+    @staticmethod
+    def has_frame_rate(frame_rate: str, fps):
+        """
+        Check whether an ffprobe r_frame_rate equals a frame rate.
+        :param frame_rate: Frame rate as reported by ffprobe, e.g. "30/1" or "30000/1001".
+        :param fps: Frame rate to compare with.
+        :return: True if both describe the same frame rate, False if they differ or cannot be parsed.
+        """
+        try:
+            return Fraction(frame_rate) == Fraction(fps)
+        except (TypeError, ValueError, ZeroDivisionError):
+            return False
+
+    def normalize_outro(self, path: str, clip_id: int = 0, crf: int = 23, preset: str = "medium"):
+        """
+        Get a copy of an outro transcoded to the exact stream parameters of a clip,
+        so it can be appended with a stream copy. Copies are kept in the outro cache,
+        keyed by the clip's profile and the outro file, and built on first use.
+        :param path: Path to the outro.
+        :param clip_id: ID of the clip whose profile the outro has to match (default: 0).
+        :param crf: Constant Rate Factor used for the outro (default: 23, as in helpers.encode_video).
+        :param preset: Encoding preset used for the outro (default: medium, as in helpers.encode_video).
+        :return: Path to the normalized outro, or the original path if it could not be normalized.
+        """
+        profile = self.get_stream_profile(clip_id)
+        # Only the formats GoExport encodes to can be reproduced
+        if not profile or not profile["video"] or not profile["audio"]:
+            return path
+        vcodec, vprofile, width, height, pix_fmt, frame_rate, time_base = profile["video"]
+        acodec, sample_rate, channels = profile["audio"]
+        if vcodec != "h264" or acodec != "aac":
+            return path
+        # Level and reference frames are not part of the profile tuple, but a decoder
+        # initialised by the capture's parameter sets has to accept the outro's as well
+        match_args = self.get_match_args(probe.get_stream(probe.probe(self.clips[clip_id]), "video") or {})
+        if not match_args:
+            return path
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return path
+        key = hashlib.sha1(json.dumps([
+            profile["video"], profile["audio"], match_args, crf, preset,
+            os.path.abspath(path), stat.st_size, stat.st_mtime,
+        ]).encode()).hexdigest()[:16]
+
+        cache_folder = helpers.get_path(None, helpers.get_config("PATH_OUTRO_CACHE"))
+        name = os.path.splitext(os.path.basename(path))[0]
+        cached = os.path.join(cache_folder, f"{name}_{key}.mp4")
+        if os.path.exists(cached):
             try:
-                # Get the clip's file extension
-                ext = self.clips[clip_id].split(".")[-1]
-                trimmed_path = self.clips[clip_id].replace(f".{ext}", f"_trimmed_{start}_{end}.{ext}")
-                helpers.try_command(
-                    helpers.get_path(helpers.get_app_folder(), helpers.get_config("PATH_FFMPEG_WINDOWS")),
-                    "-ss", str(start),
-                    "-i", self.clips[clip_id],
-                    "-c", "copy",
-                    "-t", str(end - start),
-                    trimmed_path
-                )
-                self.clips[clip_id] = trimmed_path
-                print(f"Clip {clip_id} trimmed: {str(start)} - {str(end)}")
-                print(f"All clips: {self.clips}")
-            except Exception as e:
-                raise RuntimeError(f"Error trimming clip {clip_id}: {e}")
-        elif helpers.os_is_linux():
+                # Mark as used for the eviction in prune_outro_cache
+                os.utime(cached)
+            except OSError:
+                pass
+            print(f"Using cached outro: {cached}")
+            return cached
+
+        os.makedirs(cache_folder, exist_ok=True)
+        # Written under a name of its own and moved into place when complete, so parallel
+        # workers never read a half-written entry
+        temp = os.path.join(cache_folder, f"{name}_{key}.{os.getpid()}.tmp")
+
+        # Outros without sound get silence, the null source is cut to the video length
+        outro_profile = self.get_file_profile(path)
+        audio_input = "[0:a]" if outro_profile and outro_profile["audio"] else "[1:a]"
+
+        command = [
+            helpers.get_ffmpeg_path(),
+            "-y",
+            "-i", path,
+            "-f", "lavfi",
+            "-i", f"anullsrc=r={sample_rate}:cl={'mono' if channels == 1 else 'stereo'}",
+            "-filter_complex",
+            f"[0:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color=black,"
+            f"setsar=1,fps={frame_rate},format={pix_fmt}[v];"
+            f"{audio_input}aresample={sample_rate}[a]",
+            "-map", "[v]",
+            "-map", "[a]",
+            "-c:v", "libx264",
+            "-preset", preset,
+            "-crf", str(crf),
+            *match_args,
+        ]
+        if time_base and "/" in time_base:
+            command.extend(["-video_track_timescale", time_base.split("/")[1]])
+        command.extend([
+            "-c:a", "aac",
+            "-b:a", "128k",
+            "-ar", str(sample_rate),
+            "-ac", str(channels),
+            "-shortest",
+            "-movflags", "+faststart",
+            "-f", "mp4",
+            temp,
+        ])
+
+        if not helpers.try_command(*command):
+            print(f"Could not normalize outro {path}, it will be re-encoded with the video.")
+            if os.path.exists(temp):
+                os.remove(temp)
+            return path
+        os.replace(temp, cached)
+        print(f"Outro normalized: {cached}")
+        self.prune_outro_cache(cache_folder)
+        return cached
+
+    def prune_outro_cache(self, folder: str):
+        """
+        Remove the least recently used outros once the cache holds more than OUTRO_CACHE_MAX_ENTRIES.
+        :param folder: Outro cache folder.
+        """
+        entries = []
+        for entry in os.listdir(folder):
+            if entry.endswith(".mp4"):
+                try:
+                    entries.append((os.path.getmtime(os.path.join(folder, entry)), entry))
+                except OSError:
+                    pass
+        entries.sort(reverse=True)
+        for _, entry in entries[helpers.get_config("OUTRO_CACHE_MAX_ENTRIES"):]:
             try:
-                # Get the clip's file extension
-                ext = self.clips[clip_id].split(".")[-1]
-                trimmed_path = self.clips[clip_id].replace(f".{ext}", f"_trimmed_{start}_{end}.{ext}")
+                os.remove(os.path.join(folder, entry))
+            except OSError:
+                pass
+
+    def smart_trim(self, clip_id: int, start: float, end: float, output: str):
+        """
+        Frame-accurate trim that only re-encodes the video up to the first keyframe
+        after the cut point and stream-copies everything after it.
+        :param clip_id: ID of the clip to trim.
+        :param start: Start time in seconds.
+        :param end: End time in seconds.
+        :param output: Path to write the trimmed clip to.
+        :return: True if the clip was trimmed, False if a plain stream copy should be used instead.
+        """
+        ffmpeg = helpers.get_ffmpeg_path()
+        clip = self.clips[clip_id]
+
+        stream = probe.get_stream(probe.probe(clip), "video") or {}
+        codec_name = stream.get("codec_name")
+        if codec_name != "h264":
+            print(f"Smart trim only supports H.264 clips (got {codec_name}), using keyframe trim")
+            return False
+        # The re-encoded head is joined to the source's GOPs by stream copy, so its
+        # parameter sets have to describe a stream the source's decoder state accepts
+        match_args = self.get_match_args(stream)
+        if not match_args:
+            print(f"Smart trim cannot match the H.264 profile {stream.get('profile')}, using keyframe trim")
+            return False
+
+        keyframes = [k for k in self.get_keyframes(clip_id, start, end) if start <= k < end]
+        if not keyframes:
+            print(f"No keyframe found between {start} and {end}, using keyframe trim")
+            return False
+        keyframe = keyframes[0]
+        if keyframe - start < 0.001:
+            # The cut is already on a keyframe, a stream copy is exact
+            return False
+
+        base, _ = os.path.splitext(output)
+        # The parts are MP4, reading MPEG-TS back crashes some FFmpeg builds
+        head_path = f"{base}_head.mp4"
+        tail_path = f"{base}_tail.mp4"
+        try:
+            # Re-encode the partial GOP in front of the keyframe
+            head = helpers.try_command(
+                ffmpeg, "-y",
+                "-ss", str(start),
+                "-i", clip,
+                "-t", str(keyframe - start),
+                "-map", "0:v:0",
+                "-c:v", "libx264",
+                "-preset", "medium",
+                "-crf", "18",
+                *match_args,
+                "-f", "mp4",
+                head_path
+            )
+            # Copy everything from the keyframe onward
+            tail = helpers.try_command(
+                ffmpeg, "-y",
+                "-ss", str(keyframe),
+                "-i", clip,
+                "-t", str(end - keyframe),
+                "-map", "0:v:0",
+                "-c:v", "copy",
+                "-f", "mp4",
+                tail_path
+            )
+            if not (head and tail):
+                return False
+
+            # Join the video parts and copy the audio straight from the source. auto_convert
+            # turns each part into Annex B with its own parameter sets in-band, so the
+            # copied GOPs keep the source's SPS/PPS instead of the head's
+            file_list = self.export_to_file([head_path, tail_path], f"{os.path.basename(base)}_parts.txt")
+            joined = helpers.try_command(
+                ffmpeg, "-y",
+                "-f", "concat", "-safe", "0", "-auto_convert", "1", "-i", file_list,
+                "-ss", str(start),
+                "-i", clip,
+                "-t", str(end - start),
+                "-map", "0:v:0",
+                "-map", "1:a?",
+                "-c", "copy",
+                "-movflags", "+faststart",
+                output
+            )
+            os.remove(file_list)
+            if not joined:
+                return False
+            # Decode across the join, past the first copied GOP
+            if not self.decodes(output, keyframe - start + helpers.get_config("SMART_TRIM_CHECK_DURATION")):
+                print("The smart-trimmed clip does not decode cleanly, using keyframe trim")
+                os.remove(output)
+                return False
+            return True
+        finally:
+            for path in (head_path, tail_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def decodes(self, path: str, duration: float, start: float = 0):
+        """
+        Check that part of a file decodes without errors.
+        :param path: Path to the file.
+        :param duration: Seconds to decode.
+        :param start: Seconds into the file to start decoding at (default: 0). Decoding starts
+                      at the keyframe before it, so the frames leading up to it are checked too.
+        :return: True if FFmpeg decoded it without reporting an error, False otherwise.
+        """
+        seek = ["-ss", f"{start:.3f}"] if start > 0 else []
+        result = helpers.create_logged_run(
+            [helpers.get_ffmpeg_path(), "-v", "error", *seek, "-t", f"{duration:.3f}", "-i", path, "-map", "0:v:0", "-f", "null", "-"],
+            log_output=False,
+            capture_output=True,
+            text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0
+        )
+        if result.returncode != 0 or result.stderr.strip():
+            print(f"Decode check of {path} failed: {result.stderr.strip()}")
+            return False
+        return True
+
+    def joins_decode(self, path: str):
+        """
+        Check that a stream-copy concat of the clips decodes across every join.
+        :param path: Path to the concatenated file.
+        :return: True if every join decoded without errors, False otherwise.
+        """
+        check = helpers.get_config("SMART_TRIM_CHECK_DURATION")
+        join = 0
+        for clip_id in range(len(self.clips) - 1):
+            join += self.get_clip_length(clip_id)
+            if not self.decodes(path, 2 * check, max(join - check, 0)):
+                return False
+        return True
+
+    def get_edit_list(self):
+        """
+        Get the edit list of the editor.
+        :return: List of (clip, start, end) tuples, where start and end are None for untrimmed clips.
+        """
+        return [
+            (clip, *(self.ranges[i] or (None, None)))
+            for i, clip in enumerate(self.clips)
+        ]
+
+    def trim(self, clip_id: int, start: float, end: float, accurate: bool = True):
+        """
+        Trim a clip to the specified start and end times.
+        In lazy mode the trim is only recorded in the edit list and applied during render.
+        :param clip_id: ID of the clip to trim.
+        :param start: Start time in seconds.
+        :param end: End time in seconds.
+        :param accurate: Cut on the exact frame by re-encoding only the GOP containing the cut
+                         (default: True). If False, or if the smart trim is not possible, the
+                         start snaps to the previous keyframe.
+        :raises IndexError: If the clip ID is out of range.
+        """
+        if clip_id < 0 or clip_id >= len(self.clips):
+            raise IndexError(f"Clip ID {clip_id} is out of range.")
+
+        if self.lazy:
+            # Times are relative to the clip as it is currently edited
+            offset = self.ranges[clip_id][0] if self.ranges[clip_id] else 0
+            self.ranges[clip_id] = (offset + start, offset + end)
+            print(f"Clip {clip_id} trim recorded: {str(start)} - {str(end)}")
+            print(f"Edit list: {self.get_edit_list()}")
+            return
+
+        self.trim_file(clip_id, start, end, accurate)
+
+    def trim_file(self, clip_id: int, start: float, end: float, accurate: bool = True):
+        """
+        Trim a clip into a new file and replace the clip with it.
+        :param clip_id: ID of the clip to trim.
+        :param start: Start time in seconds.
+        :param end: End time in seconds.
+        :param accurate: Use a frame-accurate smart cut where possible (default: True).
+        """
+        ffmpeg = helpers.get_ffmpeg_path()
+        if not ffmpeg:
+            raise NotImplementedError("Trimming is not implemented for this OS.")
+
+        try:
+            # Get the clip's file extension
+            ext = self.clips[clip_id].split(".")[-1]
+            trimmed_path = self.clips[clip_id].replace(f".{ext}", f"_trimmed_{start}_{end}.{ext}")
+            if not (accurate and self.smart_trim(clip_id, start, end, trimmed_path)):
                 helpers.try_command(
-                    helpers.get_path(helpers.get_app_folder(), helpers.get_config("PATH_FFMPEG_LINUX")),
+                    ffmpeg,
                     "-ss", str(start),
                     "-i", self.clips[clip_id],
                     "-c", "copy",
                     "-t", str(end - start),
                     trimmed_path
                 )
-                self.clips[clip_id] = trimmed_path
-                print(f"Clip {clip_id} trimmed: {str(start)} - {str(end)}")
-                print(f"All clips: {self.clips}")
-            except Exception as e:
-                raise RuntimeError(f"Error trimming clip {clip_id}: {e}")
-        else:
-            raise NotImplementedError("Trimming is not implemented for this OS.")
+            self.clips[clip_id] = trimmed_path
+            self.ranges[clip_id] = None
+            print(f"Clip {clip_id} trimmed: {str(start)} - {str(end)}")
+            print(f"All clips: {self.clips}")
+        except Exception as e:
+            raise RuntimeError(f"Error trimming clip {clip_id}: {e}")
 
-    def export_to_file(self):
+    def apply_trims(self):
+        """
+        Write every trim recorded in the edit list to its own file.
+        Needed before a stream-copy render, which cannot cut clips by itself.
+        """
+        for clip_id, edit in enumerate(self.ranges):
+            if edit:
+                self.trim_file(clip_id, *edit)
+
+    def export_to_file(self, clips: list | None = None, filename: str = "clips.txt"):
         """
         Exports the video clips to a text file for ffmpeg concat (copy mode only).
+        :param clips: Clips to export (default: the editor's clips).
+        :param filename: Name of the list file inside the data folder.
         """
+        if clips is None:
+            clips = self.clips
         output_file = helpers.get_path(
             None,
             helpers.get_config("DEFAULT_OUTPUT_FILENAME"),
-            "clips.txt"
+            filename
         )
         with open(output_file, "w", encoding="utf-8") as f:
-            for clip in self.clips:
+            for clip in clips:
                 normalized_clip = clip.replace("\\", "/")
                 while "//" in normalized_clip:
                     normalized_clip = normalized_clip.replace("//", "/")
@@ -141,21 +689,28 @@ class Editor:
         """
         Concatenate all clips and save to 'output'.
         - reencode=False  -> fast concat (requires identical input formats)
-        - reencode=True   -> safe concat via filter_complex (handles mixed codecs/sizes)
+        - reencode=True   -> safe concat via filter_complex (handles mixed codecs/sizes),
+                             unless every clip already matches the target format, in which
+                             case the fast concat is used instead
+        A fast concat that does not decode cleanly across a join is re-encoded after all.
+        Trims recorded in the edit list are applied by the same FFmpeg invocation when re-encoding.
         """
         if not self.clips:
             raise ValueError("No clips to render.")
 
         try:
-            if helpers.os_is_windows():
-                ffmpeg = helpers.get_path(helpers.get_app_folder(), helpers.get_config("PATH_FFMPEG_WINDOWS"))
-            elif helpers.os_is_linux():
-                ffmpeg = helpers.get_path(helpers.get_app_folder(), helpers.get_config("PATH_FFMPEG_LINUX"))
-            else:
+            ffmpeg = helpers.get_ffmpeg_path()
+            if not ffmpeg:
                 raise NotImplementedError("Unsupported OS for rendering.")
 
+            if reencode and self.can_stream_copy(target_width, target_height, fps):
+                print("All clips match the target format, joining them without re-encoding.")
+                reencode = False
+
             if not reencode:
                 # ---------- FAST PATH: concat demuxer + stream copy ----------
+                # Stream copy cannot cut, so pending trims are written out first
+                self.apply_trims()
                 file_list = self.export_to_file()
                 command = [
                     ffmpeg,
@@ -166,13 +721,18 @@ class Editor:
                     "-c", "copy",
                     output,
                 ]
-                helpers.try_command(*command, return_output=True)
-                return
+                if helpers.try_command(*command) and self.joins_decode(output):
+                    return
+                print("The stream-copied render does not decode cleanly, re-encoding it instead.")
 
             # ---------- SAFE PATH: concat filter + re-encode ----------
-            # Build inputs
+            # Build inputs, seeking each one to its in-point. Since everything is
+            # re-encoded, input seeking is frame-accurate and avoids decoding the
+            # trimmed-off part of the clip.
             command = [ffmpeg, "-y"]
-            for clip in self.clips:
+            for clip, start, end in self.get_edit_list():
+                if start is not None:
+                    command.extend(["-ss", str(start), "-t", str(end - start)])
                 command.extend(["-i", clip])
 
             n = len(self.clips)
@@ -0,0 +1,131 @@
+# Player events module
+# Receives the player's start/stop events from the browser as they happen, instead of polling the page for them
+
+from modules.logger import logger
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import helpers
+import threading
+
+# Page variables the player sets when the video starts and stops
+EVENT_NAMES = ("startRecord", "stopRecord")
+
+class EventHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        received = helpers.get_timestamp()
+        name = self.path.strip("/")
+        length = int(self.headers.get("Content-Length") or 0)
+        value = self.rfile.read(length).decode("utf-8", errors="replace") if length else ""
+        self.server.events.receive(name, value, received)
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass  # Suppress logging
+
+class PlayerEvents:
+    """
+    A local listener the player page reports its start/stop events to.
+    A script injected into the page turns window.startRecord and window.stopRecord
+    into setters that send a beacon to the listener the moment the player sets them.
+    """
+    def __init__(self):
+        self.httpd = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.flags = {name: threading.Event() for name in EVENT_NAMES}
+        # Arrival time (ms) and page value of every received event
+        self.received = {}
+
+    @property
+    def running(self):
+        return self.httpd is not None
+
+    def start(self):
+        """
+        Start the listener on a free local port.
+        :return: True if the listener is running, False otherwise.
+        """
+        if self.running:
+            return True
+        try:
+            self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), EventHandler)
+        except OSError as e:
+            logger.warning(f"Could not start the player event listener: {e}")
+            return False
+        self.httpd.daemon_threads = True
+        self.httpd.events = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        logger.debug(f"Player event listener on port {self.httpd.server_address[1]}")
+        return True
+
+    def stop(self):
+        """Stop the listener."""
+        if not self.running:
+            return
+        try:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        except Exception as e:
+            logger.debug(f"Suppressed error stopping the player event listener: {e}")
+        self.httpd = None
+        self.thread = None
+
+    def clear(self):
+        """Forget the events of the previous export."""
+        with self.lock:
+            self.received = {}
+            for flag in self.flags.values():
+                flag.clear()
+
+    def receive(self, name: str, value: str, received: int):
+        """Record an event sent by the page."""
+        if name not in self.flags:
+            return
+        with self.lock:
+            if name in self.received:
+                return
+            self.received[name] = (received, value)
+        logger.debug(f"Player event {name}={value} received at {received} ms")
+        self.flags[name].set()
+
+    def wait(self, name: str, timeout: float):
+        """
+        Wait for an event.
+        :param name: Event name, one of EVENT_NAMES.
+        :param timeout: Seconds to wait.
+        :return: Arrival time of the event in ms, or None if it did not arrive in time.
+        """
+        if not self.flags[name].wait(timeout):
+            return None
+        with self.lock:
+            return self.received[name][0]
+
+    def script(self):
+        """
+        Get the page script that reports the events.
+        Every event is also dispatched on the window as "goexport:<name>", for other injected scripts.
+        Without a running listener the events are only dispatched.
+        :return: JavaScript source, to be evaluated before the page's own scripts.
+        """
+        url = f"http://127.0.0.1:{self.httpd.server_address[1]}/" if self.running else ""
+        names = ", ".join(f'"{name}"' for name in EVENT_NAMES)
+        return (
+            "(function () {"
+            " if (window.top !== window) return;"
+            f' var url = "{url}";'
+            f" [{names}].forEach(function (name) {{"
+            "  var value;"
+            "  Object.defineProperty(window, name, {"
+            "   configurable: true,"
+            "   get: function () { return value; },"
+            "   set: function (v) {"
+            "    value = v;"
+            "    if (url) { try { navigator.sendBeacon(url + name, String(v)); } catch (e) {} }"
+            "    window.dispatchEvent(new CustomEvent(\"goexport:\" + name));"
+            "   }"
+            "  });"
+            " });"
+            "})();"
+        )
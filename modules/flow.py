@@ -1,24 +1,34 @@
 import os
+import uuid
+import errno
 import helpers
 from modules.editor import Editor
 from modules.navigator import Interface
 from modules.capture import Capture
+from modules.offline_capture import Capture as OfflineCapture
 from modules.server import Server
 from modules.exceptions import TimeoutError
+from modules import sync
 from rich.prompt import Prompt, IntPrompt, Confirm
 from rich import print
 from modules.logger import logger
 
 class Controller:
     def __init__(self):
-        self.editor = Editor()
+        self.editor = Editor(lazy=True)
         self.capture = Capture()
         self.browser = Interface(obs=self.capture.is_obs)
+        self.capture.attach(self.browser)
         self.aspect_ratio = None
         self.resolution = None
         self.auto_edit = None
         self.legacy = False
+        # When play() was called (ms), the start marker is shown from there
+        self.played = None
         self.PROJECT_FOLDER = None  
+        self.server = None
+        # Keep the server running between exports (batch mode)
+        self.persistent = False
 
     # Set up
     def setup(self):
@@ -74,20 +84,43 @@ class Controller:
     def start_server(self):
         # Start the server
         if self.host:
+            if self.persistent and self.server:
+                logger.debug("Reusing the running server")
+                return
             self.server = Server()
             try:
                 self.server.start()
+            except OSError as e:
+                if e.errno not in (errno.EADDRINUSE, getattr(errno, "WSAEADDRINUSE", None)):
+                    logger.error(f"Error starting server: {e}")
+                    self.server = None
+                    return False
+                # Another GoExport process (e.g. the parent of a worker) already serves the player
+                logger.info(f"Using the server already running on {self.server.hostname()}")
+                self.server = None
             except Exception as e:
                 logger.error(f"Error starting server: {e}")
                 return False
 
     def stop_server(self):
-        if self.host:
+        if self.server and not self.persistent:
             try:
                 self.server.stop()
             except Exception as e:
                 logger.error(f"Error stopping server: {e}")
                 return False
+            self.server = None
+
+    def abort(self):
+        """Stop whatever a failed export left running, so the next export starts clean."""
+        if self.capture.is_screencast:
+            self.capture.screencast.cleanup()
+        elif not self.capture.is_obs:
+            self.capture.native.cleanup()
+        try:
+            self.browser.close(discard=True)
+        except Exception as e:
+            logger.debug(f"Suppressed error closing the browser: {e}")
 
     def set_aspect_ratio(self, aspect_ratio: str|None = None):
         if not helpers.get_param("no_input"):
@@ -137,7 +170,8 @@ class Controller:
         if self.width > 1280 and self.height > 720:
             print("[bold yellow]Warning: The resolution you have selected is higher than 720p. This may cause issues with the recording. Please ensure your system can handle this resolution.")
         
-        if not helpers.get_param("skip_resolution_check"):
+        # Screencasts are captured at their own size, whatever the monitor
+        if not helpers.get_param("skip_resolution_check") and not self.capture.is_screencast:
             if helpers.exceeds_monitor_resolution(self.width, self.height, helpers.get_param("monitor_index")):
                 logger.error("The selected resolution exceeds your monitor's resolution. Please select a lower resolution.")
                 return False
@@ -167,6 +201,7 @@ class Controller:
                 raise ValueError(f"Invalid service: {service}")
         
         logger.info(f"User chose {service}")
+        self.service = service
         service_data = AVAILABLE_SERVICES[service]
 
         # Check if should host, template, window name, and after load scripts
@@ -289,7 +324,10 @@ class Controller:
         self.filename = f"{self.readable_filename}{helpers.get_config('DEFAULT_OUTPUT_EXTENSION')}"
 
         if path is None:
-            self.RECORDING = helpers.get_path(None, helpers.get_config("DEFAULT_OUTPUT_FILENAME"), self.filename)
+            # Parallel workers start exports in the same second and share the data folder, so the
+            # intermediate recording is named per process and export
+            recording = f"{self.readable_filename}_{os.getpid()}_{uuid.uuid4().hex[:8]}{helpers.get_config('DEFAULT_OUTPUT_EXTENSION')}"
+            self.RECORDING = helpers.get_path(None, helpers.get_config("DEFAULT_OUTPUT_FILENAME"), recording)
         else:
             self.RECORDING = path
 
@@ -343,23 +381,56 @@ class Controller:
             height=self.height,
             wide=int(self.widescreen),
             resource_port=helpers.get_config("WRAPPER_RESOURCE_PORT"),
+            server_port=helpers.get_param("server_port") or helpers.get_config("SERVER_PORT"),
         )
 
+    def sync_start(self, estimate: float):
+        """
+        Get where the video starts in the recording.
+        The start marker is looked for around the clock-based estimate; without it,
+        the estimate is corrected by the latency measured on earlier exports.
+        :param estimate: Start time estimated from the timestamps, in seconds.
+        :return: Start time in seconds.
+        """
+        if not helpers.get_config("SYNC_MARKER"):
+            return estimate
+        marker = sync.find_marker(self.RECORDING, estimate)
+        if marker:
+            sync.calibrate((marker[0] - estimate) * 1000)
+            return marker[1]
+        latency = sync.get_latency()
+        logger.warning(f"Start marker not found, using the timestamps with a {latency} ms correction")
+        return max(0.0, estimate + helpers.ms_to_s(latency + helpers.get_config("SYNC_MARKER_DURATION")))
+
     def export(self):
         try:
-            if not self.browser.start():
+            # Offline renders step the paused player, nothing is recorded in real time
+            offline = helpers.get_param("capture_backend") == "offline"
+            legacy = self.legacy and not offline
+            # Part of a split export (--split): only this time range of the movie is recorded
+            range_start = float(helpers.get_param("range_start") or 0)
+            range_end = helpers.get_param("range_end")
+            ranged = range_end is not None and not offline and not legacy
+            self.played = None
+            if offline and not helpers.get_param("movie_duration"):
+                logger.error("Offline renders need the length of the movie (--movie-duration)")
+                return False
+            if not self.browser.start(legacy=legacy):
                 logger.error("Could not start webdriver")
                 return False
 
             if self.template: # This is for if the website in question doesn't already have the controller embedded; so we inject it ourselves.
                 self.browser.inject_in_future('function obj_DoFSCommand(command, args) { switch (command) { case "start": startRecord = Date.now(); console.log("Video started " + startRecord); document.getElementById("obj").pause(); try{document.getElementById("obj").seek(0)}catch(e){document.getElementById("obj").seek(0.1)} break; case "stop": stopRecord = Date.now(); console.log("Video stopped " + stopRecord); break; } }')
 
-            if not self.capture.is_obs:
+            # Screencasts and offline renders do not record the screen, so it may be used meanwhile
+            if not self.capture.is_obs and not self.capture.is_screencast and not offline:
                 if not self.browser.warning(self.width, self.height):
                     logger.error("Could not show warning")
                     return False
+                # Start the ring buffer (--ring-buffer) while the player loads
+                self.capture.native.prepare(self.RECORDING, self.width, self.height)
 
-            if self.legacy:
+            if legacy:
                 if not self.capture.start(self.RECORDING, self.width, self.height, self.display_name):
                     logger.error("Could not start recording")
                     return False
@@ -369,18 +440,16 @@ class Controller:
             except Exception as e:
                 raise RuntimeError(f"Failed to load {self.svr_url}: {e}")
 
-            # Check if the site has any data; if so, do nothing
-            if self.browser.check_data(self.svr_url):
-                offset = 1
-            else:
-                offset = 0
-
-            if not self.browser.enable_flash(offset=offset):
+            if not self.browser.enable_flash():
                 logger.error("Could not enable flash")
                 return False
 
             for script in self.afterloadscripts:
-                self.browser.inject_now(self.format(script))
+                script = self.format(script)
+                if self.browser.proxy:
+                    # Load the cacheable assets through the caching proxy
+                    script = self.browser.proxy.rewrite(script)
+                self.browser.inject_now(script)
 
             # Get timeout values from parameters
             load_timeout = helpers.get_param("load_timeout") or 30
@@ -391,37 +460,55 @@ class Controller:
                 logger.error("Could not wait for start")
                 return False
             
-            if not self.legacy:
-                if not self.capture.start(self.RECORDING, self.width, self.height, self.display_name):
-                    logger.error("Could not start recording")
+            if offline:
+                renderer = OfflineCapture(self.browser)
+                if not renderer.render(self.RECORDING, self.width, self.height):
+                    logger.error("Could not render the video")
                     return False
-                else:
-                    self.browser.play()
+                recording = renderer.filename
+            else:
+                if not legacy:
+                    if not self.capture.start(self.RECORDING, self.width, self.height, self.display_name):
+                        logger.error("Could not start recording")
+                        return False
+                    else:
+                        if range_start:
+                            self.browser.seek(range_start)
+                        self.played = helpers.get_timestamp()
+                        self.browser.play()
             
-            self.prestart = self.capture.start_time  # Timestamp for when FFmpeg started (ms)
-            self.prestart_delay = self.capture.startup_delay  # Ensure delay is accounted for (ms)
-            logger.debug(f"Prestart: {self.prestart} | Delay: {self.prestart_delay}")
-
-            # Wait for video to complete with timeout
-            if not self.browser.await_completed(timeout_minutes=video_timeout):
-                logger.error("Could not wait for completion")
-                return False
+                self.prestart = self.capture.start_time  # Timestamp for when FFmpeg started (ms)
+                self.prestart_delay = self.capture.startup_delay  # Ensure delay is accounted for (ms)
+                logger.debug(f"Prestart: {self.prestart} | Delay: {self.prestart_delay}")
+
+                if ranged:
+                    # Record a little past the end of the range, the overlap is cut when editing.
+                    # The player only reports the end of the movie, so running out the time is the normal case
+                    duration = float(range_end) - range_start + helpers.get_config("SPLIT_OVERLAP") + helpers.ms_to_s(helpers.get_config("SYNC_MARKER_DURATION"))
+                    if self.browser.await_event("stopRecord", duration) is not None:
+                        logger.warning("The movie ended before the recording of this part did, --movie-duration may be too long")
+                # Wait for video to complete with timeout
+                elif not self.browser.await_completed(timeout_minutes=video_timeout):
+                    logger.error("Could not wait for completion")
+                    return False
 
-            if not self.capture.stop():
-                logger.error("Could not stop the recording")
-                return False
-            self.postend = self.capture.end_time  # Timestamp for when FFmpeg ended (ms)
-            self.postend_delay = self.capture.ended_delay  # Ensure delay is accounted for (ms)
+                if not self.capture.stop():
+                    logger.error("Could not stop the recording")
+                    return False
+                self.postend = self.capture.end_time  # Timestamp for when FFmpeg ended (ms)
+                self.postend_delay = self.capture.ended_delay  # Ensure delay is accounted for (ms)
+                recording = self.capture.filename
 
             # Update paths
-            self.setpath(self.capture.filename)
+            self.setpath(recording)
 
             # Stop the server
             self.stop_server()
 
             # Get timestamps from the browser for when the video started and ended
-            timestamps = self.browser.get_timestamps()
-            video_started, video_ended, video_length, video_start_offset, video_end_offset = timestamps
+            if legacy:
+                timestamps = self.browser.get_timestamps()
+                video_started, video_ended, video_length, video_start_offset, video_end_offset = timestamps
 
             if not self.browser.close():
                 logger.error("Couldn't stop the browser")
@@ -433,7 +520,7 @@ class Controller:
                 clip_id = len(self.editor.clips)
                 self.editor.add_clip(self.RECORDING, clip_id)
 
-                if self.legacy:
+                if legacy:
                     # Calculate the starting and ending times for the clip
                     if None in (self.prestart_delay, video_started, video_start_offset, self.prestart):
                         logger.error("One or more timestamp values are None. Cannot calculate start time.")
@@ -442,12 +529,37 @@ class Controller:
 
                     # Combine the calculated times
                     starting = started
-                    self.start_from = helpers.ms_to_s(starting)
+                    self.start_from = self.sync_start(helpers.ms_to_s(starting))
                     self.end_at = self.editor.get_clip_length(clip_id)
                     logger.debug(f"{self.start_from} : {self.end_at}")
 
                     # Trim the video first
                     self.editor.trim(clip_id, self.start_from, self.end_at)
+                elif helpers.get_config("SYNC_MARKER") and not offline:
+                    # The capture started before play(), cut what was recorded before the marker
+                    # Where play() was called, counted from the start of the capture
+                    estimate = helpers.ms_to_s(self.played - self.prestart) if self.played and self.prestart else 0.0
+                    marker = sync.find_marker(self.RECORDING, max(0.0, estimate))
+                    if marker:
+                        self.start_from = marker[1]
+                        self.end_at = self.editor.get_clip_length(clip_id)
+                        self.editor.trim(clip_id, self.start_from, self.end_at)
+
+                if ranged:
+                    # Cut the overlap, so the part ends where the next one starts
+                    range_length = float(range_end) - range_start
+                    clip_length = self.editor.get_clip_length(clip_id)
+                    if clip_length < range_length - helpers.get_config("SPLIT_TOLERANCE"):
+                        logger.error(f"The part covers {clip_length:.3f}s of its {range_length:.3f}s range")
+                        return False
+                    self.end_at = min(clip_length, range_length)
+                    self.editor.trim(clip_id, 0, self.end_at)
+                elif helpers.get_param("auto_trim") and not range_start:
+                    # Drop the black and silent stretches left at either end
+                    try:
+                        self.editor.auto_trim(clip_id)
+                    except Exception as e:
+                        logger.warning(f"Could not auto-trim the recording: {e}")
 
                 # Return success
                 return True
@@ -476,14 +588,21 @@ class Controller:
 
     def final(self, outro=True):
         try:
+            outro_key = None
             if self.aspect_ratio == "16:9" and outro:
-                self.editor.add_clip(helpers.get_path(helpers.get_app_folder(), helpers.get_config(f"OUTRO_WIDE_{self.width}x{self.height}")), len(self.editor.clips))
+                outro_key = f"OUTRO_WIDE_{self.width}x{self.height}"
             elif self.aspect_ratio == "9:16" and outro:
-                self.editor.add_clip(helpers.get_path(helpers.get_app_folder(), helpers.get_config(f"OUTRO_TALL_{self.width}x{self.height}")), len(self.editor.clips))
+                outro_key = f"OUTRO_TALL_{self.width}x{self.height}"
             elif self.aspect_ratio == "4:3" and outro:
-                self.editor.add_clip(helpers.get_path(helpers.get_app_folder(), helpers.get_config(f"OUTRO_STANDARD_{self.width}x{self.height}")), len(self.editor.clips))
+                outro_key = f"OUTRO_STANDARD_{self.width}x{self.height}"
             elif self.aspect_ratio == "14:9" and outro:
-                self.editor.add_clip(helpers.get_path(helpers.get_app_folder(), helpers.get_config(f"OUTRO_WIDE_{self.width}x{self.height}")), len(self.editor.clips))
+                outro_key = f"OUTRO_WIDE_{self.width}x{self.height}"
+            if outro_key:
+                outro_path = helpers.get_path(helpers.get_app_folder(), helpers.get_config(outro_key))
+                # Match the outro to the capture so it can be appended without re-encoding
+                if self.editor.clips:
+                    outro_path = self.editor.normalize_outro(outro_path)
+                self.editor.add_clip(outro_path, len(self.editor.clips))
         except Exception as e:
             print(f"[bold yellow]Warning:[/bold yellow] Failed to add the outro: {e}")
         
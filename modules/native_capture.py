@@ -6,6 +6,12 @@ import os
 import tempfile
 import threading
 import shlex
+import csv
+import time
+from concurrent.futures import ThreadPoolExecutor
+from modules.editor import Editor
+from modules.ring_capture import RingBuffer
+from modules import benchmark
 from modules.logger import logger
 
 class Capture:
@@ -18,6 +24,13 @@ class Capture:
     
     This ensures the capture buffer never overflows while still producing
     high-quality output identical to the previous implementation.
+
+    Alternatively, the "direct" encode mode encodes to the final format during
+    capture, so only a remux (no re-encode) is needed once capture stops, and
+    the "pipeline" encode mode runs the encoder alongside the capture, tailing
+    the raw file as it grows so only the last few seconds remain at stop.
+    The "segmented" encode mode splits the capture into fixed-length segments
+    and encodes each closed segment in parallel across the available cores.
     """
     def __init__(self):
         self.start_time = None
@@ -27,9 +40,22 @@ class Capture:
         self.filename = None
         self.raw_filename = None
         self.process = None
+        self.encoder = None
+        self.segment_list = None
+        self.segments = []
+        self.segment_pool = None
+        self.segment_thread = None
+        # x264 threads per segment encoder, set when the encoders start
+        self.segment_threads = 1
         self.width = None
         self.height = None
         self.output_thread = None
+        self.encode_mode = None
+        # Always-on capture recordings are cut from (--ring-buffer), and the start of the current one
+        self.ring = None
+        self.ring_start = None
+        # Browser whose audio sink is recorded (see get_monitor)
+        self.browser = None
         atexit.register(self.cleanup)
         for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
             signal.signal(sig, self._signal_handler)
@@ -53,7 +79,25 @@ class Capture:
                     self.process.kill()
                 except Exception:
                     pass
+
+        if self.encoder and self.encoder.poll() is None:
+            try:
+                logger.info("Terminating ffmpeg encoder process due to application exit")
+                self.encoder.terminate()
+                self.encoder.wait(timeout=2)
+            except (subprocess.TimeoutExpired, Exception) as e:
+                logger.error(f"Error terminating ffmpeg encoder process: {e}")
+                try:
+                    self.encoder.kill()
+                except Exception:
+                    pass
+        
+        if self.segment_pool:
+            self.segment_pool.shutdown(wait=False, cancel_futures=True)
         
+        if self.ring:
+            self.ring.stop()
+
         # Clean up temporary raw file if it exists
         if self.raw_filename and os.path.exists(self.raw_filename):
             try:
@@ -62,94 +106,270 @@ class Capture:
             except Exception as e:
                 logger.warning(f"Could not remove temporary raw file {self.raw_filename}: {e}")
 
-    def start(self, output: str, width: int, height: int):
+    def get_encode_mode(self):
         """
-        Start capturing screen video using raw format for minimal encoding overhead.
-        
-        :param output: Final output path for the encoded video.
+        Get the encode mode selected by the user, falling back to the default if unknown.
+
+        :return: One of the modes in AVAILABLE_ENCODE_MODES.
+        """
+        mode = helpers.get_param("encode_mode") or helpers.get_config("DEFAULT_ENCODE_MODE")
+        if mode not in helpers.get_config("AVAILABLE_ENCODE_MODES"):
+            logger.warning(f"Unknown encode mode '{mode}', falling back to {helpers.get_config('DEFAULT_ENCODE_MODE')}")
+            mode = helpers.get_config("DEFAULT_ENCODE_MODE")
+        if mode == "pipeline" and helpers.get_param("ffmpeg_encode_override"):
+            # An override command cannot be told to tail a file that is still being written
+            logger.warning("Pipeline encode mode does not support --ffmpeg-encode-override, falling back to post")
+            mode = "post"
+        if mode == "segmented" and (helpers.get_param("ffmpeg_windows_override") or helpers.get_param("ffmpeg_linux_override")):
+            # Override commands write a single file, there are no segments to pick up
+            logger.warning("Segmented encode mode does not support capture override commands, falling back to post")
+            mode = "post"
+        return mode
+
+    def get_codec_settings(self):
+        """
+        Get the codec settings used by the capture process for the current encode mode.
+
+        Presets and thread counts come from the benchmarked encoder profile when there is one.
+
+        :return: Dictionary of codec settings (also used as override placeholders).
+        """
+        if self.encode_mode == "direct":
+            # Encode straight to the final codecs, fast enough to keep up with real time
+            profile = benchmark.get_profile("encode", self.width, self.height)
+            preset = profile["preset"] if profile else helpers.get_config("DIRECT_ENCODE_PRESET")
+            crf = str(helpers.get_config("DIRECT_ENCODE_CRF"))
+            return {
+                "suffix": "_capture.mkv",
+                "vcodec": "libx264",
+                "video_args": ["-preset", preset, "-crf", crf, "-tune", "zerolatency"],
+                "preset": preset,
+                "crf": crf,
+                "tune": "zerolatency",
+                "pix_fmt": "yuv420p",
+                "acodec": "aac",
+                "ar": "44100",
+                "audio_args": ["-b:a", "128k"],
+                "output_args": ["-threads", str(profile["threads"])] if profile else [],
+            }
+
+        profile = benchmark.get_profile("capture", self.width, self.height)
+        preset = profile["preset"] if profile else "ultrafast"
+        raw_codec = self.get_raw_codec()
+        if raw_codec == "x264":
+            vcodec = "libx264"
+            video_args = ["-preset", preset, "-crf", "0", "-tune", "zerolatency"]
+            if profile:
+                video_args.extend(["-threads", str(profile["threads"])])
+        elif raw_codec == "ffv1":
+            # Intra-only, with slices so every core gets a share of each frame
+            vcodec = "ffv1"
+            video_args = ["-level", "3", "-g", "1", "-slices", str(helpers.get_config("RAW_FFV1_SLICES")), "-slicecrc", "0"]
+        elif raw_codec == "utvideo":
+            vcodec = "utvideo"
+            video_args = []
+        else:
+            vcodec = "rawvideo"
+            video_args = []
+        # Matroska cannot hold uncompressed video reliably, NUT can. NUT is also
+        # designed to be read back while it is still being written (pipeline mode).
+        container = "nut" if raw_codec == "rawvideo" or self.encode_mode == "pipeline" else "mkv"
+        settings = {
+            "vcodec": vcodec,
+            "video_args": video_args,
+            # Override placeholders keep describing the x264 settings
+            "preset": preset,
+            "crf": "0",
+            "tune": "zerolatency",
+            "pix_fmt": "yuv420p",
+            "acodec": "pcm_s16le",
+            "ar": "44100",
+            "audio_args": [],
+        }
+
+        if self.encode_mode == "segmented":
+            # Lossless segments, with a keyframe forced at every segment boundary
+            segment_duration = helpers.get_config("SEGMENT_DURATION")
+            return {
+                **settings,
+                "suffix": f"_raw_%05d.{container}",
+                "output_args": [
+                    "-force_key_frames", f"expr:gte(t,n_forced*{segment_duration})",
+                    "-f", "segment",
+                    "-segment_time", str(segment_duration),
+                    "-segment_format", "nut" if container == "nut" else "matroska",
+                    "-reset_timestamps", "1",
+                    "-segment_list", self.segment_list,
+                    "-segment_list_type", "csv",
+                ],
+            }
+
+        # Lossless intermediate that is re-encoded after (or, in pipeline mode, during) capture
+        return {
+            **settings,
+            "suffix": f"_raw.{container}",
+            "output_args": [],
+        }
+
+    def get_raw_codec(self):
+        """
+        Get the codec for the lossless capture stage.
+
+        In "auto" mode x264 is used while it keeps up with the capture size: according to the
+        benchmarked encoder profile if there is one, or up to RAW_CODEC_X264_MAX_PIXELS otherwise.
+        Above that, the cheapest codec the output disk can keep up with is used: uncompressed
+        video, then utvideo, then FFV1.
+
+        :return: One of the codecs in AVAILABLE_RAW_CODECS, except "auto".
+        """
+        codec = helpers.get_param("raw_codec") or helpers.get_config("DEFAULT_RAW_CODEC")
+        if codec not in helpers.get_config("AVAILABLE_RAW_CODECS"):
+            logger.warning(f"Unknown raw codec '{codec}', falling back to {helpers.get_config('DEFAULT_RAW_CODEC')}")
+            codec = helpers.get_config("DEFAULT_RAW_CODEC")
+        if codec != "auto":
+            return codec
+
+        profile = benchmark.get_profile("capture", self.width, self.height)
+        if profile:
+            x264_keeps_up = profile["speed"] >= helpers.get_config("BENCHMARK_REALTIME_MARGIN")
+        else:
+            x264_keeps_up = self.width * self.height <= helpers.get_config("RAW_CODEC_X264_MAX_PIXELS")
+        if x264_keeps_up:
+            return "x264"
+
+        # Uncompressed 4:2:0 video at 30 fps
+        raw_rate = self.width * self.height * 1.5 * 30
+        bandwidth = self.get_disk_bandwidth(os.path.dirname(self.filename))
+        headroom = helpers.get_config("RAW_CODEC_DISK_HEADROOM")
+        if bandwidth >= raw_rate * headroom:
+            codec = "rawvideo"
+        elif bandwidth >= raw_rate / 2 * headroom:
+            # utvideo roughly halves screen content at a fraction of FFV1's cost
+            codec = "utvideo"
+        else:
+            codec = "ffv1"
+        logger.info(f"Selected {codec} raw codec for {self.width}x{self.height} ({bandwidth / (1024*1024):.0f} MB/s disk, {raw_rate / (1024*1024):.0f} MB/s uncompressed)")
+        return codec
+
+    def get_disk_bandwidth(self, directory: str):
+        """
+        Get the sequential write bandwidth of the disk holding a directory.
+        The measurement is stored in data.json, so each directory is only measured once.
+
+        :param directory: Directory to measure.
+        :return: Write bandwidth in bytes per second (0 if it could not be measured).
+        """
+        directory = os.path.realpath(directory or helpers.get_cwd())
+        measured = helpers.load("disk_bandwidth", {}) or {}
+        if directory in measured:
+            return measured[directory]
+
+        size = helpers.get_config("RAW_DISK_TEST_SIZE")
+        chunk = os.urandom(8 * 1024 * 1024)
+        bandwidth = 0
+        try:
+            os.makedirs(directory, exist_ok=True)
+            handle, path = tempfile.mkstemp(prefix="goexport_disk_", dir=directory)
+            try:
+                started = time.perf_counter()
+                written = 0
+                while written < size:
+                    written += os.write(handle, chunk)
+                os.fsync(handle)
+                bandwidth = int(written / (time.perf_counter() - started))
+            finally:
+                os.close(handle)
+                os.remove(path)
+        except Exception as e:
+            logger.warning(f"Could not measure disk bandwidth of {directory}: {e}")
+            return 0
+
+        measured[directory] = bandwidth
+        helpers.save("disk_bandwidth", measured)
+        logger.info(f"Measured disk bandwidth of {directory}: {bandwidth / (1024*1024):.0f} MB/s")
+        return bandwidth
+
+    def get_encode_settings(self):
+        """
+        Get the settings for the encode to the final format, from the benchmarked
+        encoder profile when there is one.
+
+        :return: Dictionary with "crf", "preset" and "threads" (None to let x264 decide).
+        """
+        profile = benchmark.get_profile("encode", self.width, self.height)
+        if profile:
+            return {"crf": 23, "preset": profile["preset"], "threads": profile["threads"]}
+        return {"crf": 23, "preset": "medium", "threads": None}
+
+    def get_monitor(self):
+        """
+        Get the monitor of the audio sink the current browser plays into.
+        :return: PulseAudio source name, or None if the browser plays into the default sink.
+        """
+        return self.browser.audio_source if self.browser else None
+
+    def get_capture_command(self, output: str, width: int, height: int, codec: dict):
+        """
+        Build the FFmpeg command that records the screen.
+        Honours the capture override commands and custom arguments of the current OS.
+
+        :param output: Path (or segment pattern) the capture is written to.
         :param width: Width of the capture area.
         :param height: Height of the capture area.
-        :return: True if capture started successfully, False otherwise.
+        :param codec: Codec settings from get_codec_settings, optionally with "input_args" for the screen input.
+        :return: The command as a list, or None if the OS is unsupported.
         """
-        # Store parameters for later encoding
-        self.filename = output
-        self.width = width
-        self.height = height
-        
-        # Create a temporary file for raw capture in the same directory as output
-        output_dir = os.path.dirname(output)
-        temp_basename = os.path.basename(output).replace('.mp4', '_raw.mkv')
-        self.raw_filename = os.path.join(output_dir, temp_basename)
-        
-        logger.info(f"Starting raw video capture to: {self.raw_filename}")
-        
         # Check for command overrides first
         ffmpeg_windows_override = helpers.get_param("ffmpeg_windows_override")
         ffmpeg_linux_override = helpers.get_param("ffmpeg_linux_override")
+
+        # Placeholders available to override commands
+        placeholders = {
+            "ffmpeg": helpers.get_ffmpeg_path(),
+            "output": output,
+            "width": width,
+            "height": height,
+            "rtbufsize": "1500M",
+            "crop": f"{width}:{height}:0:0",
+            "vcodec": codec["vcodec"],
+            "acodec": codec["acodec"],
+            "preset": codec["preset"],
+            "crf": codec["crf"],
+            "tune": codec["tune"],
+            "pix_fmt": codec["pix_fmt"],
+            "ar": codec["ar"],
+        }
         
         if helpers.os_is_windows():
             if ffmpeg_windows_override:
                 # User provided a complete override command
                 logger.info("Using FFmpeg Windows override command")
-                # Get FFmpeg path for placeholder replacement
-                ffmpeg_path = helpers.get_path(helpers.get_app_folder(), helpers.get_config("PATH_FFMPEG_WINDOWS"))
                 
                 # Handle both string and list overrides
                 if isinstance(ffmpeg_windows_override, str):
                     # Replace placeholders with actual values FIRST using str.format()
-                    override_string = ffmpeg_windows_override.format(
-                        ffmpeg=ffmpeg_path,
-                        output=self.raw_filename,
-                        width=width,
-                        height=height,
-                        rtbufsize="1500M",
-                        crop=f"{width}:{height}:0:0",
-                        vcodec="libx264",
-                        acodec="pcm_s16le",
-                        preset="ultrafast",
-                        crf="0",
-                        tune="zerolatency",
-                        pix_fmt="yuv420p",
-                        ar="44100"
-                    )
+                    override_string = ffmpeg_windows_override.format(**placeholders)
                     # Parse the override string into a list AFTER replacement
                     command = shlex.split(override_string)
                 else:
                     # Already a list, format each element
-                    command = [
-                        arg.format(
-                            ffmpeg=ffmpeg_path,
-                            output=self.raw_filename,
-                            width=width,
-                            height=height,
-                            rtbufsize="1500M",
-                            crop=f"{width}:{height}:0:0",
-                            vcodec="libx264",
-                            acodec="pcm_s16le",
-                            preset="ultrafast",
-                            crf="0",
-                            tune="zerolatency",
-                            pix_fmt="yuv420p",
-                            ar="44100"
-                        )
-                        for arg in ffmpeg_windows_override
-                    ]
+                    command = [arg.format(**placeholders) for arg in ffmpeg_windows_override]
             else:
-                # Windows: Use dshow with minimal encoding
-                # Use ultrafast preset and nut/mkv container for minimal overhead
+                # Windows: Use dshow
                 command = [
-                    helpers.get_path(helpers.get_app_folder(), helpers.get_config("PATH_FFMPEG_WINDOWS")), "-y",
+                    helpers.get_ffmpeg_path(), "-y",
                     "-f", "dshow",
                     "-rtbufsize", "1500M",  # Increase buffer size to prevent overflow
+                    *codec.get("input_args", []),
                     "-i", "video=screen-capture-recorder:audio=virtual-audio-capturer",
                     "-vf", f"crop={width}:{height}:0:0",  # Crop to exact dimensions
-                    "-c:v", "libx264",  # Use H.264 for raw capture
-                    "-preset", "ultrafast",  # Fastest encoding to keep up with capture
-                    "-crf", "0",  # Lossless quality for raw capture
-                    "-tune", "zerolatency",  # Optimize for real-time encoding
-                    "-pix_fmt", "yuv420p",  # Standard pixel format
-                    "-c:a", "pcm_s16le",  # Uncompressed audio for raw capture
-                    "-ar", "44100",  # Standard audio sample rate
+                    "-c:v", codec["vcodec"],
+                    *codec["video_args"],  # Fast enough to keep up with capture
+                    "-pix_fmt", codec["pix_fmt"],  # Standard pixel format
+                    "-c:a", codec["acodec"],
+                    *codec["audio_args"],
+                    "-ar", codec["ar"],  # Standard audio sample rate
+                    *codec["output_args"],
                 ]
                 # Add custom arguments if provided
                 ffmpeg_windows_args = helpers.get_param("ffmpeg_windows_args")
@@ -158,84 +378,45 @@ class Capture:
                     custom_args = shlex.split(ffmpeg_windows_args)
                     command.extend(custom_args)
                 # Add output file at the end
-                command.append(self.raw_filename)
+                command.append(output)
                 
         elif helpers.os_is_linux():
+            # Get the X11 display and audio source from parameters
+            x11_display = helpers.get_param("x11grab_display") or ":0.0"
+            pulse_audio = helpers.get_pulse_source(self.get_monitor())
+            placeholders.update(display=x11_display, pulse_audio=pulse_audio, ac="2")
+
             if ffmpeg_linux_override:
                 # User provided a complete override command
                 logger.info("Using FFmpeg Linux override command")
-                # Get FFmpeg path for placeholder replacement
-                ffmpeg_path = helpers.get_path(helpers.get_app_folder(), helpers.get_config("PATH_FFMPEG_LINUX"))
-                # Get X11 and audio settings
-                x11_display = helpers.get_param("x11grab_display") or ":0.0"
-                pulse_audio = helpers.get_param("pulse_audio") or "alsa_output.pci-0000_00_1b.0.analog-stereo.monitor"
                 
                 # Handle both string and list overrides
                 if isinstance(ffmpeg_linux_override, str):
                     # Replace placeholders with actual values FIRST using str.format()
-                    override_string = ffmpeg_linux_override.format(
-                        ffmpeg=ffmpeg_path,
-                        output=self.raw_filename,
-                        width=width,
-                        height=height,
-                        display=x11_display,
-                        pulse_audio=pulse_audio,
-                        rtbufsize="1500M",
-                        crop=f"{width}:{height}:0:0",
-                        vcodec="libx264",
-                        acodec="pcm_s16le",
-                        preset="ultrafast",
-                        crf="0",
-                        tune="zerolatency",
-                        pix_fmt="yuv420p",
-                        ac="2",
-                        ar="44100"
-                    )
+                    override_string = ffmpeg_linux_override.format(**placeholders)
                     # Parse the override string into a list AFTER replacement
                     command = shlex.split(override_string)
                 else:
                     # Already a list, format each element
-                    command = [
-                        arg.format(
-                            ffmpeg=ffmpeg_path,
-                            output=self.raw_filename,
-                            width=width,
-                            height=height,
-                            display=x11_display,
-                            pulse_audio=pulse_audio,
-                            rtbufsize="1500M",
-                            crop=f"{width}:{height}:0:0",
-                            vcodec="libx264",
-                            acodec="pcm_s16le",
-                            preset="ultrafast",
-                            crf="0",
-                            tune="zerolatency",
-                            pix_fmt="yuv420p",
-                            ac="2",
-                            ar="44100"
-                        )
-                        for arg in ffmpeg_linux_override
-                    ]
+                    command = [arg.format(**placeholders) for arg in ffmpeg_linux_override]
             else:
-                # Linux: Use x11grab with minimal encoding
-                # Get the X11 display from parameters, default to :0.0
-                x11_display = helpers.get_param("x11grab_display") or ":0.0"
-                pulse_audio = helpers.get_param("pulse_audio") or "alsa_output.pci-0000_00_1b.0.analog-stereo.monitor"
+                # Linux: Use x11grab
                 command = [
-                    helpers.get_path(helpers.get_app_folder(), helpers.get_config("PATH_FFMPEG_LINUX")), "-y",
+                    helpers.get_ffmpeg_path(), "-y",
                     "-f", "x11grab",
                     "-s", f"{width}x{height}",
+                    *codec.get("input_args", []),
                     "-i", x11_display,
                     "-f", "pulse",
                     "-i", pulse_audio,
                     "-ac", "2",
-                    "-c:v", "libx264",
-                    "-preset", "ultrafast",
-                    "-crf", "0",
-                    "-tune", "zerolatency",
-                    "-pix_fmt", "yuv420p",
-                    "-c:a", "pcm_s16le",
-                    "-ar", "44100",
+                    "-c:v", codec["vcodec"],
+                    *codec["video_args"],
+                    "-pix_fmt", codec["pix_fmt"],
+                    "-c:a", codec["acodec"],
+                    *codec["audio_args"],
+                    "-ar", codec["ar"],
+                    *codec["output_args"],
                 ]
                 # Add custom arguments if provided
                 ffmpeg_linux_args = helpers.get_param("ffmpeg_linux_args")
@@ -244,9 +425,98 @@ class Capture:
                     custom_args = shlex.split(ffmpeg_linux_args)
                     command.extend(custom_args)
                 # Add output file at the end
-                command.append(self.raw_filename)
+                command.append(output)
         else:
             logger.error("Unsupported OS for native capture")
+            return None
+        return command
+
+    def uses_ring(self):
+        """
+        Check whether recordings are cut from the ring buffer.
+        The ring buffer replaces the lossless capture of "post" mode; the other encode
+        modes and capture override commands keep their own capture process.
+        """
+        if not helpers.get_param("ring_buffer"):
+            return False
+        if self.encode_mode != "post" or helpers.get_param("ffmpeg_windows_override") or helpers.get_param("ffmpeg_linux_override"):
+            logger.warning("The ring buffer only works in post encode mode without a capture override, capturing normally")
+            return False
+        return True
+
+    def start_ring(self, codec: dict):
+        """
+        Make sure the ring buffer is running at the current capture size.
+        :param codec: Codec settings from get_codec_settings.
+        :return: True if recordings can be cut from the ring buffer, False otherwise.
+        """
+        if not self.uses_ring():
+            return False
+        if not self.ring:
+            self.ring = RingBuffer(self)
+        if not self.ring.start(self.width, self.height, codec):
+            logger.warning("Could not start the ring buffer, capturing normally")
+            return False
+        return True
+
+    def prepare(self, output: str, width: int, height: int):
+        """
+        Start the ring buffer ahead of the recording, so its startup is not paid when the video starts.
+        Does nothing without --ring-buffer.
+        :param output: Final output path for the encoded video.
+        :param width: Width of the capture area.
+        :param height: Height of the capture area.
+        """
+        if not helpers.get_param("ring_buffer"):
+            return
+        self.filename = output
+        self.width = width
+        self.height = height
+        self.encode_mode = self.get_encode_mode()
+        self.start_ring(self.get_codec_settings())
+
+    def start(self, output: str, width: int, height: int):
+        """
+        Start capturing screen video.
+
+        In "post" mode the capture is written losslessly with minimal encoding overhead and
+        re-encoded once capture stops. In "direct" mode the capture is encoded to the final
+        codecs while recording, so stopping only needs a remux.
+        
+        :param output: Final output path for the encoded video.
+        :param width: Width of the capture area.
+        :param height: Height of the capture area.
+        :return: True if capture started successfully, False otherwise.
+        """
+        # Store parameters for later encoding
+        self.filename = output
+        self.width = width
+        self.height = height
+        self.encode_mode = self.get_encode_mode()
+        self.ring_start = None
+        output_dir = os.path.dirname(output)
+        if self.encode_mode == "segmented":
+            self.segment_list = os.path.join(output_dir, os.path.basename(output).replace('.mp4', '_segments.csv'))
+            self.segments = []
+        codec = self.get_codec_settings()
+        
+        # Create a temporary file for the capture in the same directory as output
+        temp_basename = os.path.basename(output).replace('.mp4', codec["suffix"])
+        self.raw_filename = os.path.join(output_dir, temp_basename)
+
+        if self.start_ring(codec):
+            # The capture is already running, the recording starts now
+            self.start_time = helpers.get_timestamp("Ring buffer recording started")
+            self.startup_delay = 0
+            self.ring_start = self.start_time
+            self.ring.pin(self.start_time)
+            logger.info(f"Recording from the ring buffer to: {self.raw_filename}")
+            return True
+        
+        logger.info(f"Starting {self.encode_mode} video capture ({codec['vcodec']}) to: {self.raw_filename}")
+        
+        command = self.get_capture_command(self.raw_filename, width, height, codec)
+        if not command:
             return False
 
         logger.debug(f"Capture command: {' '.join(command)}")
@@ -300,40 +570,247 @@ class Capture:
         self.output_thread = threading.Thread(target=consume_output, daemon=True)
         self.output_thread.start()
 
+        if self.encode_mode == "pipeline" and not self.start_encoder():
+            logger.warning("Pipeline encoder could not be started, the capture will be encoded once it stops")
+
+        if self.encode_mode == "segmented":
+            self.start_segment_encoders()
+
+        return True
+
+    def start_segment_encoders(self):
+        """
+        Start the pool that encodes capture segments, and the thread that feeds it
+        each segment as soon as the capture closes it.
+        """
+        workers = helpers.get_param("encode_workers") or helpers.get_config("SEGMENT_ENCODE_WORKERS")
+        if not workers:
+            workers = max(1, (os.cpu_count() or 2) // 2)
+        workers = int(workers)
+        # Share the cores between the encoders instead of letting each one claim all of them
+        self.segment_threads = max(1, (os.cpu_count() or 1) // workers)
+        self.segment_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="segment_encoder")
+        self.segment_thread = threading.Thread(target=self.watch_segments, daemon=True)
+        self.segment_thread.start()
+        logger.info(f"Started {workers} segment encoders ({self.segment_threads} threads each)")
+
+    def watch_segments(self):
+        """Poll the segment list and submit newly closed segments until the capture exits."""
+        while True:
+            finished = self.process.poll() is not None
+            self.collect_segments()
+            if finished:
+                break
+            time.sleep(0.5)
+
+    def collect_segments(self):
+        """Submit every segment listed in the segment list that has not been submitted yet."""
+        if not self.segment_pool or not os.path.exists(self.segment_list):
+            return
+        with open(self.segment_list, "r", encoding="utf-8", newline="") as f:
+            content = f.read()
+        # Ignore a trailing entry that FFmpeg is still writing
+        lines = content.splitlines(keepends=True)
+        if lines and not lines[-1].endswith("\n"):
+            lines.pop()
+        rows = [row for row in csv.reader(lines) if row]
+        output_dir = os.path.dirname(self.filename)
+        for row in rows[len(self.segments):]:
+            raw = os.path.join(output_dir, os.path.basename(row[0]))
+            encoded = os.path.splitext(raw.replace("_raw_", "_seg_"))[0] + ".mp4"
+            # Audio is left out of the segments and encoded once from the raw capture,
+            # so no encoder priming gaps end up at the segment boundaries
+            settings = self.get_encode_settings()
+            future = self.segment_pool.submit(
+                helpers.encode_video,
+                input_path=raw,
+                output_path=encoded,
+                width=self.width,
+                height=self.height,
+                crf=settings["crf"],
+                preset=settings["preset"],
+                output_args=["-an", "-threads", str(self.segment_threads)]
+            )
+            self.segments.append((raw, encoded, future))
+            logger.debug(f"Queued capture segment for encoding: {raw}")
+
+    def finish_segments(self):
+        """
+        Wait for every segment to be encoded and join them into the final output.
+        Video segments are joined by stream copy; audio is encoded once from the raw segments.
+
+        :return: True if all segments were encoded and joined, False otherwise.
+        """
+        if not self.segment_pool:
+            logger.error("The segment encoders were not started")
+            return False
+        self.segment_thread.join()
+        logger.info(f"Waiting for {len(self.segments)} segments to finish encoding...")
+        results = [future.result() for _, _, future in self.segments]
+        self.segment_pool.shutdown()
+        if not self.segments or not all(results):
+            logger.error("One or more capture segments failed to encode")
+            return False
+
+        editor = Editor()
+        basename = os.path.splitext(os.path.basename(self.filename))[0]
+        video_list = editor.export_to_file([encoded for _, encoded, _ in self.segments], f"{basename}_video.txt")
+        audio_list = editor.export_to_file([raw for raw, _, _ in self.segments], f"{basename}_audio.txt")
+        joined = helpers.try_command(
+            helpers.get_ffmpeg_path(), "-y",
+            "-f", "concat", "-safe", "0", "-i", video_list,
+            "-f", "concat", "-safe", "0", "-i", audio_list,
+            "-map", "0:v", "-map", "1:a?",
+            "-c:v", "copy",
+            "-c:a", "aac", "-b:a", "128k", "-ar", "44100",
+            "-movflags", "+faststart",
+            self.filename
+        )
+        for path in (video_list, audio_list):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return bool(joined)
+
+    def remove_segments(self):
+        """Remove the raw and encoded capture segments."""
+        for raw, encoded, _ in self.segments:
+            for path in (raw, encoded):
+                if os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except Exception as e:
+                        logger.warning(f"Could not remove capture segment {path}: {e}")
+        if self.segment_list and os.path.exists(self.segment_list):
+            try:
+                os.remove(self.segment_list)
+            except Exception as e:
+                logger.warning(f"Could not remove segment list {self.segment_list}: {e}")
+
+    def start_encoder(self):
+        """
+        Start the pipeline encoder, which encodes the raw capture while it is still being written.
+        FFmpeg's file protocol follows the growing file and only reaches end of file once no new
+        data arrives for PIPELINE_TAIL_TIMEOUT seconds, which happens after the capture stops.
+
+        :return: True if the encoder started, False otherwise.
+        """
+        # The capture process creates the file on startup, make sure it is there before tailing it
+        if not helpers.wait_for(True, lambda: os.path.exists(self.raw_filename), reason="raw capture file", timeout=5):
+            logger.error(f"Raw capture file not found: {self.raw_filename}")
+            return False
+
+        tail_timeout = helpers.get_config("PIPELINE_TAIL_TIMEOUT") * 1_000_000  # microseconds
+        settings = self.get_encode_settings()
+        command = helpers.build_encode_command(
+            input_path=f"file:{self.raw_filename}",
+            output_path=self.filename,
+            width=self.width,
+            height=self.height,
+            crf=settings["crf"],
+            preset=settings["preset"],
+            input_args=["-nostdin", "-follow", "1", "-rw_timeout", str(tail_timeout)],
+            output_args=["-threads", str(settings["threads"])] if settings["threads"] else None
+        )
+        if not command:
+            logger.error("Unsupported OS for video encoding")
+            return False
+
+        logger.debug(f"Pipeline encode command: {' '.join(command)}")
+        try:
+            self.encoder = helpers.create_logged_popen(
+                command,
+                process_name="ffmpeg_encode",
+                cwd=helpers.get_cwd(),
+                stdin=subprocess.DEVNULL,
+                creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0,
+            )
+        except Exception as e:
+            logger.error(f"Failed to start pipeline encoder: {e}")
+            self.encoder = None
+            return False
+
+        logger.info(f"Started FFmpeg pipeline encoder (PID: {self.encoder.pid})")
+        return True
+
+    def finish_encoder(self):
+        """
+        Wait for the pipeline encoder to catch up with the end of the capture.
+
+        :return: True if the encoder finished successfully, False otherwise.
+        """
+        logger.info("Waiting for pipeline encoder to finish...")
+        offset = helpers.get_timestamp("Pipeline encoder finishing")
+        returncode = self.encoder.wait()
+        # Let the logging thread drain the remaining output
+        log_thread = getattr(self.encoder, "_log_thread", None)
+        if log_thread:
+            log_thread.join(timeout=5)
+        if returncode != 0:
+            logger.error(f"Pipeline encoder failed with return code {returncode}")
+            return False
+        logger.info(f"Pipeline encoder finished ({helpers.get_timestamp('Pipeline encoder finished') - offset}ms after capture stopped)")
         return True
 
     def stop(self):
         """
-        Stop capturing and encode the raw video to the final format.
+        Stop capturing and encode (or remux, in "direct" mode) the capture to the final format.
         
         :return: True if capture stopped and encoding succeeded, False otherwise.
         """
-        if not self.process:
+        if self.ring_start is not None:
+            # The ring buffer keeps running, the recording is cut out of it
+            logger.info("Stopping video capture...")
+            self.end_time = helpers.get_timestamp("Ring buffer recording ended")
+            self.ended_delay = 0
+            try:
+                cut = self.ring.cut(self.ring_start, self.end_time, self.raw_filename)
+            finally:
+                self.ring.unpin(self.ring_start)
+                self.ring_start = None
+            if not cut:
+                return False
+        elif not self.process:
             logger.error("No capture process to stop")
             return False
-        
-        logger.info("Stopping video capture...")
-        
-        # Send 'q' to FFmpeg to gracefully stop
-        try:
-            offset = helpers.get_timestamp("FFmpeg capture stopping")
-            self.process.stdin.write("q")
-            self.process.stdin.flush()
-            self.process.communicate(timeout=10)
-            self.process.wait(timeout=10)
-            self.end_time = helpers.get_timestamp("FFmpeg capture ended")
-            self.ended_delay = self.end_time - offset
-            logger.info(f"Capture stopped successfully (shutdown delay: {self.ended_delay}ms)")
-        except subprocess.TimeoutExpired:
-            logger.warning("FFmpeg did not stop gracefully, terminating...")
-            self.process.terminate()
+        else:
+            logger.info("Stopping video capture...")
+
+            # Send 'q' to FFmpeg to gracefully stop
             try:
-                self.process.wait(timeout=5)
+                offset = helpers.get_timestamp("FFmpeg capture stopping")
+                self.process.stdin.write("q")
+                self.process.stdin.flush()
+                self.process.communicate(timeout=10)
+                self.process.wait(timeout=10)
+                self.end_time = helpers.get_timestamp("FFmpeg capture ended")
+                self.ended_delay = self.end_time - offset
+                logger.info(f"Capture stopped successfully (shutdown delay: {self.ended_delay}ms)")
             except subprocess.TimeoutExpired:
-                logger.error("FFmpeg did not terminate, killing...")
-                self.process.kill()
-                self.process.wait()
-        
+                logger.warning("FFmpeg did not stop gracefully, terminating...")
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    logger.error("FFmpeg did not terminate, killing...")
+                    self.process.kill()
+                    self.process.wait()
+
+        if self.segment_pool:
+            # Most segments were encoded during capture, only the tail is left
+            encode_success = self.finish_segments()
+            self.segment_pool = None
+            if not encode_success:
+                logger.error("Failed to encode capture segments to final format")
+                logger.warning(f"Capture segments preserved next to: {self.filename}")
+                return False
+            self.remove_segments()
+            final_size = os.path.getsize(self.filename)
+            logger.info(f"Final encoded size: {final_size / (1024*1024):.2f} MB")
+            logger.info(f"Encoding complete: {self.filename}")
+            return True
+
         # Check if raw file was created
         if not os.path.exists(self.raw_filename):
             logger.error(f"Raw capture file not found: {self.raw_filename}")
@@ -342,16 +819,36 @@ class Capture:
         raw_size = os.path.getsize(self.raw_filename)
         logger.info(f"Raw capture size: {raw_size / (1024*1024):.2f} MB")
         
-        # Encode the raw video to final format
-        logger.info("Encoding raw capture to final format...")
-        encode_success = helpers.encode_video(
-            input_path=self.raw_filename,
-            output_path=self.filename,
-            width=self.width,
-            height=self.height,
-            crf=23,  # Good quality (same as before)
-            preset="medium"  # Balanced preset for good quality/speed
-        )
+        encode_success = False
+        if self.encoder:
+            # The capture has been encoding in the background, wait for it to catch up
+            encode_success = self.finish_encoder()
+            self.encoder = None
+            if not encode_success:
+                logger.warning("Falling back to encoding the raw capture from the start")
+
+        if encode_success:
+            logger.info("Pipeline encoder produced the final output")
+        elif self.encode_mode == "direct":
+            # The capture is already in the final format, only the container changes
+            logger.info("Remuxing capture to final format...")
+            encode_success = helpers.remux_video(
+                input_path=self.raw_filename,
+                output_path=self.filename
+            )
+        else:
+            # Encode the raw video to final format
+            logger.info("Encoding raw capture to final format...")
+            settings = self.get_encode_settings()
+            encode_success = helpers.encode_video(
+                input_path=self.raw_filename,
+                output_path=self.filename,
+                width=self.width,
+                height=self.height,
+                crf=settings["crf"],  # Good quality (same as before)
+                preset=settings["preset"],  # Benchmarked preset, or medium for good quality/speed
+                output_args=["-threads", str(settings["threads"])] if settings["threads"] else None
+            )
         
         if not encode_success:
             logger.error("Failed to encode raw capture to final format")
@@ -1,6 +1,10 @@
 import helpers
 from modules.logger import logger
 from modules.exceptions import TimeoutError
+from modules.events import PlayerEvents
+from modules.proxy import CachingProxy
+from modules.virtual import NullSink
+from modules import sync
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
@@ -9,7 +13,34 @@ from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.common.exceptions import TimeoutException
 import urllib
+import base64
 import os
+import copy
+import json
+import itertools
+import shutil
+import threading
+
+class Session:
+    """A running browser, with the sites it has already been set up for."""
+    def __init__(self, driver, user_data_dir: str, sink: NullSink | None = None):
+        self.driver = driver
+        self.user_data_dir = user_data_dir
+        # Audio sink the browser plays into, if it has its own
+        self.sink = sink
+        # Origins Flash has been allowed on, the permission outlives storage resets
+        self.flash_sites = set()
+        # Origins the session has stored data for
+        self.origins = set()
+        # Scripts injected into every new document for the current export
+        self.scripts = []
+
+    def alive(self):
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
 
 class Interface:
     def __init__(self, obs: bool = False):
@@ -53,23 +84,158 @@ class Interface:
             self.options.add_argument(f"--ppapi-flash-version={flash_ver}")
 
         # Common options for both OSes
-        self.options.add_argument(f"--user-data-dir={helpers.get_path(None, helpers.get_config("DEFAULT_OUTPUT_FILENAME"), f"{helpers.get_timestamp()}_chrome_profile_temp")}")
         self.options.add_experimental_option("excludeSwitches", ["enable-automation"])
         self.options.binary_location = chromium
-        self.service = Service(executable_path=chromedriver)
+        self.chromedriver = chromedriver
+        self.obs = obs
+        self.sink_ids = itertools.count()
         self.driver = None
+        self.session = None
+        # Start/stop events pushed by the player page
+        self.events = PlayerEvents()
+        # Caching proxy for remote service assets (--proxy-cache)
+        self.proxy = CachingProxy() if helpers.get_param("proxy_cache") else None
+
+        # Warm sessions kept between exports when pooling is enabled (batch mode)
+        self.pooled = False
+        self.pool = []
+        self.pool_lock = threading.Lock()
+        self.pool_thread = None
 
-    def start(self):
-        """Initializes and starts the Selenium WebDriver."""
-        # On Linux, set DISPLAY environment variable to match x11grab_display parameter
+    def set_display(self):
+        """On Linux, set the DISPLAY environment variable to match the x11grab_display parameter."""
         if helpers.os_is_linux():
             display = helpers.get_param('x11grab_display') or ':0.0'
             os.environ['DISPLAY'] = display
             logger.info(f"Set DISPLAY environment variable to {display}")
-            
-        self.driver = webdriver.Chrome(options=self.options, service=self.service)
+
+    def preseed(self, user_data_dir: str):
+        """
+        Writes the profile preferences of a new browser so Flash is allowed on every site from the start.
+        :param user_data_dir: Profile folder the browser will be launched with.
+        """
+        preferences = {
+            "plugins": {
+                # Skip the click-to-play placeholder
+                "run_all_flash_in_allow_mode": True,
+            },
+            "profile": {
+                "default_content_setting_values": {"plugins": 1},
+                "content_settings": {
+                    "exceptions": {
+                        "plugins": {"*,*": {"setting": 1}},
+                    },
+                },
+            },
+        }
+        folder = os.path.join(user_data_dir, "Default")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, "Preferences"), "w", encoding="utf-8") as f:
+            json.dump(preferences, f)
+
+    @property
+    def audio_source(self):
+        """PulseAudio source that only records the current browser, or None if it plays into the default sink."""
+        if self.session and self.session.sink:
+            return self.session.sink.monitor
+        return None
+
+    def create_sink(self):
+        """
+        Creates the audio sink of a new browser (Linux only).
+        :return: The sink, or None if the browser plays into the default sink.
+        """
+        if not helpers.os_is_linux() or self.obs or helpers.get_param("pulse_audio") or not helpers.get_config("BROWSER_AUDIO_SINK"):
+            return None
+        sink = NullSink(f"goexport_{os.getpid()}_{next(self.sink_ids)}")
+        if not sink.start():
+            logger.warning("Could not create an audio sink for the browser, recording the default audio source")
+            return None
+        return sink
+
+    def launch(self):
+        """Launches a new browser with its own profile folder and audio sink."""
+        user_data_dir = helpers.get_path(None, helpers.get_config("DEFAULT_OUTPUT_FILENAME"), f"{helpers.get_timestamp()}_{threading.get_ident()}_chrome_profile_temp")
+        if helpers.get_config("FLASH_PRESEED"):
+            self.preseed(user_data_dir)
+        options = copy.deepcopy(self.options)
+        options.add_argument(f"--user-data-dir={user_data_dir}")
+        if self.proxy and self.proxy.start():
+            options.add_argument(f"--proxy-server=http://{self.proxy.address}")
+            # Cached assets are rewritten to plain HTTP inside HTTPS pages
+            options.add_argument("--allow-running-insecure-content")
+        sink = self.create_sink()
+        # Chromium plays into the sink named by PULSE_SINK when it starts
+        env = {**os.environ, "PULSE_SINK": sink.name} if sink else None
+        try:
+            driver = webdriver.Chrome(options=options, service=Service(executable_path=self.chromedriver, env=env))
+        except Exception:
+            if sink:
+                sink.stop()
+            raise
+        logger.info(f"Launched browser with profile {user_data_dir}")
+        return Session(driver, user_data_dir, sink)
+
+    def warm(self):
+        """Launches browsers in the background until the pool is full."""
+        self.pooled = True
+        if self.pool_thread and self.pool_thread.is_alive():
+            return
+
+        def fill():
+            self.set_display()
+            while True:
+                with self.pool_lock:
+                    if not self.pooled or len(self.pool) >= helpers.get_config("BROWSER_POOL_SIZE"):
+                        return
+                try:
+                    session = self.launch()
+                    session.driver.get("about:blank")
+                except Exception as e:
+                    logger.error(f"Could not launch a pooled browser: {e}")
+                    return
+                with self.pool_lock:
+                    self.pool.append(session)
+
+        self.pool_thread = threading.Thread(target=fill, daemon=True)
+        self.pool_thread.start()
+
+    def start(self, legacy: bool = False):
+        """
+        Initializes and starts the Selenium WebDriver, taking a warm browser from the pool if there is one.
+        :param legacy: The capture runs before the player starts, so the start marker is shown on the player's start event.
+        """
+        self.set_display()
+
+        session = None
+        if self.pooled:
+            # Don't launch a second browser while the pool is still launching one
+            if self.pool_thread and self.pool_thread.is_alive():
+                self.pool_thread.join()
+            with self.pool_lock:
+                while self.pool and session is None:
+                    candidate = self.pool.pop(0)
+                    if candidate.alive():
+                        session = candidate
+                    else:
+                        self.discard(candidate)
+        if session:
+            logger.info("Using a warm browser from the pool")
+            self.session = session
+            self.driver = session.driver
+        else:
+            self.session = self.launch()
+            self.driver = self.session.driver
+
+        self.events.clear()
+        self.events.start()
+        self.inject_in_future(self.events.script())
+        if helpers.get_config("SYNC_MARKER"):
+            self.inject_in_future(sync.get_marker_script(on_start=legacy))
+
         self.driver.get(self.start_url)
-        helpers.wait(2)
+        if not session:
+            helpers.wait(2)
         return True
     
     def warning(self, width=1280, height=720):
@@ -79,11 +245,79 @@ class Interface:
         helpers.wait(3)
         return True
 
-    def close(self):
-        """Stops the Selenium WebDriver."""
-        self.driver.quit()
+    def close(self, discard: bool = False):
+        """
+        Stops the Selenium WebDriver. When pooling, the browser is reset and kept for the next export instead.
+        :param discard: Quit the browser even when pooling (e.g. after a failed export).
+        """
+        session = self.session
+        self.session = None
+        self.driver = None
+        if session is None:
+            return True
+
+        if self.pooled and not discard and self.reset(session):
+            with self.pool_lock:
+                self.pool.append(session)
+            logger.info("Returned the browser to the pool")
+            return True
+
+        self.discard(session)
+        if not self.pooled:
+            self.events.stop()
+            if self.proxy:
+                self.proxy.stop()
         return True
 
+    def reset(self, session: Session):
+        """
+        Clears what an export left behind in a browser: injected scripts, stored site data and cookies.
+        Content settings such as the Flash permission are kept, and so is the HTTP cache: the player
+        files are revalidated against their ETag, so the next export reuses them.
+        :return: True if the browser can be reused, False otherwise.
+        """
+        try:
+            for identifier in session.scripts:
+                session.driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": identifier})
+            session.scripts.clear()
+            for origin in session.origins:
+                session.driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            session.origins.clear()
+            session.driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            session.driver.get("about:blank")
+            return True
+        except Exception as e:
+            logger.warning(f"Could not reset the browser: {e}")
+            return False
+
+    def discard(self, session: Session):
+        """Quits a browser and removes its profile folder."""
+        try:
+            session.driver.quit()
+        except Exception as e:
+            logger.debug(f"Suppressed error quitting the browser: {e}")
+        shutil.rmtree(session.user_data_dir, ignore_errors=True)
+        if session.sink:
+            session.sink.stop()
+
+    def shutdown(self):
+        """Quits every pooled browser and stops pooling."""
+        with self.pool_lock:
+            self.pooled = False
+            sessions, self.pool = self.pool, []
+        if self.pool_thread:
+            self.pool_thread.join(timeout=30)
+            with self.pool_lock:
+                sessions.extend(self.pool)
+                self.pool = []
+        for session in sessions:
+            self.discard(session)
+        if self.session:
+            self.close(discard=True)
+        self.events.stop()
+        if self.proxy:
+            self.proxy.stop()
+
     def inject_now(self, script: str):
         """Injects a JavaScript snippet into the page immediately."""
         self.driver.execute_script(script)
@@ -91,7 +325,9 @@ class Interface:
 
     def inject_in_future(self, script: str):
         """Injects a JavaScript snippet into the page."""
-        self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": f'{script}'})
+        result = self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": f'{script}'})
+        if self.session and result:
+            self.session.scripts.append(result.get("identifier"))
         logger.info("Injecting script in the future")
         return True
 
@@ -117,10 +353,53 @@ class Interface:
         # No data found
         return False
 
-    def enable_flash(self, offset: int = 0):
+    def get_origin(self, url: str):
+        """Returns the scheme://host:port part of a URL."""
+        parsed = urllib.parse.urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+    def flash_ready(self, timeout: float):
+        """
+        Waits for the Flash player on the page to run.
+        A blocked player is only a placeholder and has none of the Flash scripting methods.
+        :param timeout: Seconds to wait.
+        :return: True if the player is running, False otherwise.
+        """
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(
+                lambda driver: driver.execute_script('var obj = document.getElementById("obj"); return !!obj && typeof obj.PercentLoaded === "function"')
+            )
+            return True
+        except TimeoutException:
+            return False
+
+    def enable_flash(self, offset: int = None):
         # If people start having issues, revert 0.05 to 0.1
-        """Enables the Flash Player."""
+        """
+        Enables the Flash Player.
+        Browsers launched with a preseeded profile already allow Flash, so this only
+        goes through the settings page if the player does not start on its own.
+        :param offset: Extra TAB presses on the settings page, guessed from the site's stored data if not given.
+        """
         url = self.driver.current_url
+        origin = self.get_origin(url)
+        if self.session:
+            self.session.origins.add(origin)
+            if origin in self.session.flash_sites:
+                # A pooled browser keeps the permission from an earlier export
+                logger.info(f"Flash is already enabled for {origin}")
+                return True
+        if helpers.get_config("FLASH_PRESEED"):
+            if self.flash_ready(helpers.get_config("FLASH_CHECK_TIMEOUT")):
+                logger.info(f"Flash is allowed by the browser profile for {origin}")
+                if self.session:
+                    self.session.flash_sites.add(origin)
+                return True
+            logger.warning("Flash did not start with the preseeded profile, enabling it through the settings page")
+
+        if offset is None:
+            # The settings page has one more control if the site has stored data
+            offset = 1 if self.check_data(url) else 0
         self.driver.get(f"chrome://settings/content/siteDetails?site={urllib.parse.quote(url)}")
 
         actions = ActionChains(self.driver)
@@ -137,12 +416,45 @@ class Interface:
         actions.send_keys(Keys.ENTER)
         actions.perform()
         self.tried = True
+        if self.session:
+            self.session.flash_sites.add(origin)
 
         self.driver.back()
         self.driver.refresh()
 
         return True
 
+    def await_event(self, name: str, timeout_seconds: float):
+        """
+        Wait for the player to set window.startRecord or window.stopRecord.
+        The event is pushed by the page; the page itself is only checked every
+        PLAYER_EVENT_CHECK_INTERVAL seconds, in case the event got lost.
+        :param name: "startRecord" or "stopRecord".
+        :param timeout_seconds: Maximum seconds to wait (inf to disable timeout).
+        :return: Time the event happened (ms), or None if the timeout was reached.
+        """
+        check = f"return window.{name} !== undefined"
+        if not self.events.running:
+            try:
+                WebDriverWait(self.driver, timeout_seconds).until(lambda driver: driver.execute_script(check))
+            except TimeoutException:
+                return None
+            return helpers.get_timestamp()
+
+        interval = helpers.get_config("PLAYER_EVENT_CHECK_INTERVAL")
+        deadline = helpers.get_timestamp() + timeout_seconds * 1000
+        while True:
+            remaining = (deadline - helpers.get_timestamp()) / 1000
+            if remaining <= 0:
+                return None
+            received = self.events.wait(name, min(interval, remaining))
+            if received is not None:
+                return received
+            # Also fails here if the browser went away
+            if self.driver.execute_script(check):
+                logger.debug(f"{name} was set without an event")
+                return helpers.get_timestamp()
+
     def await_started(self, timeout_minutes: int = 30):
         """
         Wait for the video to start loading/playing.
@@ -154,22 +466,20 @@ class Interface:
         # Convert minutes to seconds, 0 means infinite wait
         timeout_seconds = timeout_minutes * 60 if timeout_minutes > 0 else float('inf')
         
-        try:
-            WebDriverWait(self.driver, timeout_seconds).until(
-                lambda driver: driver.execute_script("return window.startRecord !== undefined")
-            )
-        except TimeoutException:
+        started = self.await_event("startRecord", timeout_seconds)
+        if started is None:
             raise TimeoutError(
                 f"Video failed to load within {timeout_minutes} minutes",
                 timeout_type="load"
             )
 
-        self.startedDelay = helpers.get_timestamp("Recording started")
+        self.startedDelay = started
+        logger.debug(f"Recording started: {started} ms")
         return True
 
     def play(self):
-        """Start the video player if supported"""
-        self.driver.execute_script('document.getElementById("obj").play()')
+        """Start the video player if supported, after the start marker if it is enabled"""
+        self.driver.execute_script('var obj = document.getElementById("obj"); if (window.goexportMarker) { window.goexportMarker(function () { obj.play(); }); } else { obj.play(); }')
         return True
     
     def pause(self):
@@ -177,6 +487,36 @@ class Interface:
         self.driver.execute_script('document.getElementById("obj").pause()')
         return True
 
+    def resume(self):
+        """Continue the video player from where it is, without the start marker"""
+        self.driver.execute_script('document.getElementById("obj").play()')
+        return True
+
+    def seek(self, seconds: float):
+        """
+        Seek the video player and wait until the page has painted the new frame.
+        :param seconds: Position in the movie.
+        """
+        self.driver.execute_async_script(
+            'var done = arguments[arguments.length - 1];'
+            f' document.getElementById("obj").seek({seconds:.6f});'
+            # Two animation frames: the first one runs before the plugin's paint, the second one after it
+            ' requestAnimationFrame(function () { requestAnimationFrame(function () { done(); }); });'
+        )
+
+    def screenshot(self, width: int, height: int):
+        """
+        Grab the player area over CDP.
+        :param width: Width of the player area.
+        :param height: Height of the player area.
+        :return: The frame as PNG data.
+        """
+        result = self.driver.execute_cdp_cmd("Page.captureScreenshot", {
+            "format": "png",
+            "clip": {"x": 0, "y": 0, "width": width, "height": height, "scale": 1},
+        })
+        return base64.b64decode(result["data"])
+
     def await_completed(self, timeout_minutes: int = 0):
         """
         Wait for the video to finish playing.
@@ -188,17 +528,15 @@ class Interface:
         # Convert minutes to seconds, 0 means infinite wait
         timeout_seconds = timeout_minutes * 60 if timeout_minutes > 0 else float('inf')
         
-        try:
-            WebDriverWait(self.driver, timeout_seconds).until(
-                lambda driver: driver.execute_script("return window.stopRecord !== undefined")
-            )
-        except TimeoutException:
+        ended = self.await_event("stopRecord", timeout_seconds)
+        if ended is None:
             raise TimeoutError(
                 f"Video did not finish within {timeout_minutes} minutes after loading",
                 timeout_type="video"
             )
         
-        self.endedDelay = helpers.get_timestamp("Recording ended")
+        self.endedDelay = ended
+        logger.debug(f"Recording ended: {ended} ms")
         return True
     
     def get_timestamps(self):
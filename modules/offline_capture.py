@@ -0,0 +1,176 @@
+# Offline render module
+# Steps the paused player frame by frame and encodes screenshots, so exports are no longer tied to real time
+
+import os
+import queue
+import threading
+import subprocess
+import helpers
+from modules import benchmark
+from modules.logger import logger
+from modules.output import structured_output
+
+class Capture:
+    """
+    Renders a movie without playing it: the player is paused, seeked to every frame in
+    turn and the page is screenshotted over CDP. The screenshots are piped into an FFmpeg
+    image2pipe encoder while the next frame is being grabbed. Flash only produces sound
+    while playing, so the audio is recorded in a separate audio-only pass in real time.
+    """
+    def __init__(self, browser):
+        self.browser = browser
+        self.filename = None
+        self.frames = 0
+
+    def render(self, output: str, width: int, height: int):
+        """
+        Render the movie to a video file, up to --movie-duration seconds.
+        A paused player never plays to its end, so it cannot report where the movie stops.
+        :param output: Path of the output video.
+        :param width: Width of the player area.
+        :param height: Height of the player area.
+        :return: True if the movie was rendered, False otherwise.
+        """
+        self.filename = output
+        fps = helpers.get_config("OFFLINE_FPS")
+        duration = helpers.get_param("movie_duration")
+        silent = os.path.splitext(output)[0] + "_silent.mp4"
+        profile = benchmark.get_profile("encode", width, height)
+        command = helpers.build_encode_command(
+            input_path="-",
+            output_path=silent,
+            width=width,
+            height=height,
+            preset=profile["preset"] if profile else "medium",
+            input_args=["-f", "image2pipe", "-framerate", str(fps)],
+            output_args=["-an"] + (["-threads", str(profile["threads"])] if profile else []),
+        )
+        if not command:
+            logger.error("Unsupported OS for offline rendering")
+            return False
+
+        logger.info(f"Rendering offline at {fps} fps to: {output}")
+        encoder = helpers.create_logged_popen(
+            command,
+            process_name="ffmpeg_offline",
+            cwd=helpers.get_cwd(),
+            stdin=subprocess.PIPE,
+            creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0,
+        )
+
+        # Encoding and grabbing overlap: the writer feeds FFmpeg while the next frame is grabbed
+        frames = queue.Queue(maxsize=helpers.get_config("OFFLINE_QUEUE_SIZE"))
+        failed = threading.Event()
+
+        def write():
+            while True:
+                frame = frames.get()
+                if frame is None:
+                    break
+                if failed.is_set():
+                    continue
+                try:
+                    encoder.stdin.write(frame)
+                except OSError as e:
+                    logger.error(f"Offline encoder stopped accepting frames: {e}")
+                    failed.set()
+            try:
+                encoder.stdin.close()
+            except OSError:
+                pass
+
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+
+        self.frames = 0
+        total = int(duration * fps)
+        try:
+            self.browser.pause()
+            while self.frames < total and not failed.is_set():
+                self.browser.seek(self.frames / fps)
+                frames.put(self.browser.screenshot(width, height))
+                self.frames += 1
+                if self.frames % (fps * 10) == 0:
+                    structured_output.progress(f"Rendered {self.frames // fps}s", stage="offline_render", frames=self.frames)
+        finally:
+            frames.put(None)
+            writer.join()
+        if encoder.wait() != 0 or failed.is_set():
+            logger.error("Offline encoder failed")
+            return False
+        logger.info(f"Rendered {self.frames} frames ({self.frames / fps:.1f}s)")
+
+        if not helpers.get_config("OFFLINE_AUDIO"):
+            os.replace(silent, output)
+            return True
+        return self.record_audio(silent, output, self.frames / fps)
+
+    def record_audio(self, video: str, output: str, duration: float):
+        """
+        Play the movie once to record its sound and mux it with the rendered video.
+        Only the audio device is recorded, so this pass costs little CPU.
+        :param video: Rendered video without sound.
+        :param output: Path of the final video.
+        :param duration: Length of the movie in seconds.
+        :return: True if the video was written, False otherwise.
+        """
+        ffmpeg = helpers.get_ffmpeg_path()
+        audio_input = helpers.get_audio_input(self.browser.audio_source)
+        if not ffmpeg or not audio_input:
+            logger.error("Unsupported OS for audio capture")
+            return False
+
+        audio = os.path.splitext(output)[0] + "_audio.wav"
+        command = [ffmpeg, "-y", *audio_input, "-t", f"{duration:.3f}", "-c:a", "pcm_s16le", "-ar", "44100", audio]
+        logger.info(f"Recording {duration:.1f}s of audio for the offline render")
+        self.browser.seek(0)
+        recorder = subprocess.Popen(
+            command,
+            cwd=helpers.get_cwd(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            shell=False,
+            bufsize=1,
+            universal_newlines=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0,
+        )
+        # The audio device is open once FFmpeg writes its output header; the recording starts at 0 there
+        listening = False
+        for line in recorder.stdout:
+            logger.debug(f"[ffmpeg_offline_audio] {line.strip()}")
+            if "Output #0" in line:
+                listening = True
+                break
+        if not listening:
+            recorder.wait()
+            logger.error("Offline audio capture failed to start")
+            return False
+        self.browser.resume()
+
+        def consume_output():
+            for line in recorder.stdout:
+                logger.debug(f"[ffmpeg_offline_audio] {line.strip()}")
+
+        threading.Thread(target=consume_output, daemon=True).start()
+        if recorder.wait() != 0:
+            logger.error("Offline audio capture failed")
+            return False
+        self.browser.pause()
+
+        result = helpers.create_logged_run(
+            [ffmpeg, "-y", "-i", video, "-i", audio, "-map", "0:v", "-map", "1:a", "-c:v", "copy", "-c:a", "aac", "-b:a", "128k", "-shortest", output],
+            process_name="ffmpeg_offline_mux",
+            capture_output=True,
+            text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0
+        )
+        if result.returncode != 0:
+            logger.error(f"Failed to add audio to the offline render: {result.stderr.strip()}")
+            return False
+        for path in (video, audio):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return True
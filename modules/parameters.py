@@ -39,6 +39,20 @@ class Parameters:
         parser.add_argument("--ffmpeg-linux-override", help="Override the entire FFmpeg Linux recording command (advanced users only)", dest="ffmpeg_linux_override")
         parser.add_argument("--ffmpeg-windows-override", help="Override the entire FFmpeg Windows recording command (advanced users only)", dest="ffmpeg_windows_override")
         parser.add_argument("--ffmpeg-encode-override", help="Override the entire FFmpeg encoding command (advanced users only)", dest="ffmpeg_encode_override")
+        parser.add_argument("--encode-mode", help="Native capture encode mode: post (re-encode after capture, default), direct (encode while capturing, then remux), pipeline (encode the raw capture while it is being written) or segmented (encode capture segments in parallel)", dest="encode_mode")
+        parser.add_argument("--encode-workers", help="Number of parallel segment encoders in segmented encode mode (default: half the logical CPUs)", type=int, dest="encode_workers")
+        parser.add_argument("--raw-codec", help="Codec for the lossless capture stage: auto (default), x264, ffv1, utvideo or rawvideo", dest="raw_codec")
+        parser.add_argument("--batch", help="Run every export in a manifest (JSON or CSV file, or - for JSON lines on STDIN) in this process", dest="batch")
+        parser.add_argument("--workers", help="Run batch jobs on this many parallel workers, each with its own virtual display and audio sink (Linux only, requires Xvfb and PulseAudio)", type=int, dest="workers")
+        parser.add_argument("--split", help="Record one movie as this many parts on parallel workers and join them (Linux only, requires --movie-duration, Xvfb and PulseAudio)", type=int, dest="split")
+        parser.add_argument("--server-port", help="Port of the local player server (default: 26519)", type=int, dest="server_port")
+        parser.add_argument("--server-cache", help="Keep the player files in memory, with gzip/brotli copies of text files", action="store_true", dest="server_cache")
+        parser.add_argument("--proxy-cache", help="Load remote player assets through a local proxy that keeps them on disk between exports", action="store_true", dest="proxy_cache")
+        parser.add_argument("--capture-backend", help="How the player is captured: realtime (record the screen while the video plays, default), screencast (record the frames the browser paints, no screen or monitor needed) or offline (step the paused player frame by frame, not tied to real time)", dest="capture_backend")
+        parser.add_argument("--movie-duration", help="Length of the movie in seconds (required by --capture-backend offline and --split)", type=float, dest="movie_duration")
+        parser.add_argument("--ring-buffer", help="Keep the screen capture running between recordings and cut each recording out of it (native capture, post encode mode only)", action="store_true", dest="ring_buffer")
+        parser.add_argument("--auto-trim", help="Trim black and silent stretches from the start and end of every recording", action="store_true", dest="auto_trim")
+        parser.add_argument("--benchmark", help="Benchmark the encoder settings at every supported resolution, store the best profile and exit", action="store_true", dest="benchmark")
         parser.add_argument("--protocol", help="Protocol URL e.g. goexport://?video_id=1&user_id=1&aspect_ratio=16:9&resolution=1920x1080&no_input=true", dest="protocol")
 
         args = parser.parse_args()
@@ -100,6 +114,17 @@ class Parameters:
             "ffmpeg_linux_override": "ffmpeg_linux_override",
             "ffmpeg_windows_override": "ffmpeg_windows_override",
             "ffmpeg_encode_override": "ffmpeg_encode_override",
+            "encode_mode": "encode_mode",
+            "encode_workers": "encode_workers",
+            "raw_codec": "raw_codec",
+            "server_port": "server_port",
+            "auto_trim": "auto_trim",
+            "server_cache": "server_cache",
+            "proxy_cache": "proxy_cache",
+            "capture_backend": "capture_backend",
+            "movie_duration": "movie_duration",
+            "split": "split",
+            "ring_buffer": "ring_buffer",
         }
 
         result = {
@@ -131,6 +156,20 @@ class Parameters:
             "ffmpeg_linux_override": None,
             "ffmpeg_windows_override": None,
             "ffmpeg_encode_override": None,
+            "encode_mode": None,
+            "encode_workers": None,
+            "raw_codec": None,
+            "batch": None,
+            "workers": None,
+            "server_port": None,
+            "auto_trim": False,
+            "server_cache": False,
+            "proxy_cache": False,
+            "capture_backend": None,
+            "movie_duration": None,
+            "split": None,
+            "ring_buffer": False,
+            "benchmark": False,
         }
 
         # action/service can be provided in netloc or path; prefer netloc (e.g., goexport://upload?...).
@@ -144,14 +183,20 @@ class Parameters:
             val = _first(qname)
             if val is not None:
                 # Convert all boolean parameters
-                if dest in ("no_input", "json", "open_folder", "use_outro", "obs_no_overwrite", "obs_required", "skip_resolution_check"):
+                if dest in ("no_input", "json", "open_folder", "use_outro", "obs_no_overwrite", "obs_required", "skip_resolution_check", "auto_trim", "server_cache", "proxy_cache", "ring_buffer"):
                     result[dest] = self._str_to_bool(val)
                 # Convert integer parameters
-                elif dest in ("load_timeout", "video_timeout", "monitor_index"):
+                elif dest in ("load_timeout", "video_timeout", "monitor_index", "encode_workers", "server_port", "split"):
                     try:
                         result[dest] = int(val)
                     except ValueError:
                         pass  # Keep default if invalid
+                # Convert float parameters
+                elif dest in ("movie_duration",):
+                    try:
+                        result[dest] = float(val)
+                    except ValueError:
+                        pass  # Keep default if invalid
                 else:
                     result[dest] = val
 
@@ -0,0 +1,129 @@
+# Media probing module
+# Wraps ffprobe so every file is probed once, with one JSON call for all format and stream metadata
+
+import os
+import json
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import helpers
+from modules.logger import logger
+
+# Probe results keyed by (path, size, mtime), so a rewritten file is probed again
+_cache = {}
+_lock = threading.Lock()
+
+def _key(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime)
+
+def probe(path: str):
+    """
+    Get the format and stream metadata of a media file.
+    Results are memoized per (path, size, mtime).
+    :param path: Path to the media file.
+    :return: Dict with "format" and "streams" as reported by ffprobe, or None if the file could not be probed.
+    """
+    key = _key(path)
+    if key is None:
+        logger.debug(f"probe() file not found: {path}")
+        return None
+
+    with _lock:
+        if key in _cache:
+            return _cache[key]
+
+    ffprobe = helpers.get_ffprobe_path()
+    if not ffprobe:
+        logger.error("Unsupported OS for probing.")
+        return None
+
+    try:
+        # Probes are frequent and their output is returned, so no log file is written
+        result = helpers.create_logged_run(
+            [
+                ffprobe,
+                "-v", "error",
+                "-show_format",
+                "-show_streams",
+                "-of", "json",
+                path,
+            ],
+            log_output=False,
+            capture_output=True,
+            text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0
+        )
+    except Exception as e:
+        logger.error(f"Error probing {path}: {e}")
+        return None
+    if result.returncode != 0:
+        logger.error(f"ffprobe failed for {path}: {result.stderr.strip()}")
+        return None
+
+    try:
+        info = json.loads(result.stdout)
+    except ValueError as e:
+        logger.error(f"Invalid ffprobe output for {path}: {e}")
+        return None
+    info.setdefault("format", {})
+    info.setdefault("streams", [])
+
+    with _lock:
+        _cache[key] = info
+    logger.debug(f"probe() {path}: {len(info['streams'])} streams")
+    return info
+
+def probe_many(paths, workers: int = None):
+    """
+    Probe several media files concurrently.
+    :param paths: Paths to the media files.
+    :param workers: Number of concurrent ffprobe processes (default: one per file, up to the CPU count).
+    :return: Dict mapping each path to its probe result (None if it could not be probed).
+    """
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        return {}
+    if workers is None:
+        workers = min(len(paths), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return dict(zip(paths, pool.map(probe, paths)))
+
+def get_stream(info: dict, codec_type: str):
+    """
+    Get the first stream of a type from a probe result.
+    :param info: Probe result.
+    :param codec_type: Stream type ("video", "audio", ...).
+    :return: Stream dict, or None if there is no such stream.
+    """
+    if not info:
+        return None
+    for stream in info["streams"]:
+        if stream.get("codec_type") == codec_type:
+            return stream
+    return None
+
+def get_duration(info: dict):
+    """
+    Get the duration of a probed file in seconds.
+    :param info: Probe result.
+    :return: Duration as a float, or None if unknown.
+    """
+    if not info:
+        return None
+    duration = info["format"].get("duration")
+    if duration in (None, "N/A"):
+        # Some containers only know the stream durations
+        durations = [float(s["duration"]) for s in info["streams"] if s.get("duration") not in (None, "N/A")]
+        return max(durations) if durations else None
+    return float(duration)
+
+def clear_cache():
+    """
+    Forget all memoized probe results.
+    """
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,391 @@
+# Caching proxy module
+# Chromium goes through this proxy so immutable assets of remote services are kept on disk between exports
+
+from modules.logger import logger
+from modules.server import PlayerServer
+from http.server import BaseHTTPRequestHandler
+from http import HTTPStatus
+import urllib.parse
+import requests
+import tempfile
+import hashlib
+import helpers
+import socket
+import select
+import json
+import time
+import os
+import re
+import threading
+
+# Headers that only apply to one connection and are never forwarded
+HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "proxy-connection",
+    "te", "trailer", "transfer-encoding", "upgrade",
+}
+
+class DiskCache:
+    """
+    Content-addressed store of proxied responses.
+    Bodies are saved under their SHA-256, so assets shared between URLs are stored once;
+    an index maps each URL to its body and headers. The least recently used entries are
+    evicted once the cache grows past PROXY_CACHE_MAX_SIZE.
+    Parallel workers share the folder: every save merges the index on disk into this one,
+    so processes do not drop each other's entries.
+    """
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.index_path = os.path.join(folder, "index.json")
+        self.lock = threading.Lock()
+        # Only one thread writes the index at a time
+        self.save_lock = threading.Lock()
+        self.index = self.load()
+        self.dirty = False
+
+    def load(self):
+        """
+        Read the index on disk.
+        :return: The index, empty if there is none.
+        """
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get_object_path(self, digest: str):
+        return os.path.join(self.folder, "objects", digest[:2], digest)
+
+    def get(self, url: str):
+        """
+        Look up a cached response.
+        :param url: Upstream URL.
+        :return: Tuple (path of the body, entry dict), or None on a miss.
+        """
+        with self.lock:
+            entry = self.index.get(url)
+            if not entry:
+                return None
+            path = self.get_object_path(entry["sha256"])
+            if not os.path.exists(path):
+                del self.index[url]
+                self.dirty = True
+                return None
+            entry["last_used"] = time.time()
+            self.dirty = True
+            return path, entry
+
+    def put(self, url: str, temp_path: str, digest: str, headers: dict):
+        """
+        Store a downloaded body.
+        :param url: Upstream URL.
+        :param temp_path: Downloaded body, moved into the store.
+        :param digest: SHA-256 of the body.
+        :param headers: Response headers to replay (Content-Type and the like).
+        """
+        path = self.get_object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+        with self.lock:
+            self.index[url] = {
+                "sha256": digest,
+                "size": os.path.getsize(path),
+                "headers": headers,
+                "last_used": time.time(),
+            }
+            self.dirty = True
+        self.save()
+
+    def evict(self):
+        """Remove the least recently used bodies until the cache fits its size cap."""
+        limit = helpers.get_config("PROXY_CACHE_MAX_SIZE")
+        objects = {}
+        for entry in self.index.values():
+            # Bodies are shared; a body counts as used when any of its URLs was
+            objects[entry["sha256"]] = max(objects.get(entry["sha256"], (0, 0)), (entry["last_used"], entry["size"]))
+        total = sum(size for _, size in objects.values())
+        for digest, (_, size) in sorted(objects.items(), key=lambda item: item[1][0]):
+            if total <= limit:
+                break
+            try:
+                os.remove(self.get_object_path(digest))
+            except OSError:
+                pass
+            self.index = {url: entry for url, entry in self.index.items() if entry["sha256"] != digest}
+            total -= size
+            logger.debug(f"Evicted {digest} from the proxy cache")
+
+    def merge(self, index: dict):
+        """
+        Add the entries another process saved, keeping the most recent use of each URL.
+        Must be called with lock held.
+        :param index: Index read from disk.
+        """
+        for url, entry in index.items():
+            current = self.index.get(url)
+            if current and current["last_used"] >= entry["last_used"]:
+                continue
+            if os.path.exists(self.get_object_path(entry["sha256"])):
+                self.index[url] = entry
+
+    def save(self):
+        """Merge the index on disk, evict what no longer fits and write the index if it changed."""
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                self.merge(self.load())
+                self.evict()
+                data = json.dumps(self.index)
+                self.dirty = False
+            os.makedirs(self.folder, exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(prefix="index_", suffix=".tmp", dir=self.folder)
+            try:
+                with os.fdopen(handle, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(temp_path, self.index_path)
+            except OSError as e:
+                logger.warning(f"Could not save the proxy cache index: {e}")
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Suppress logging
+
+    def do_CONNECT(self):
+        # HTTPS is tunnelled as is; only assets rewritten to plain HTTP are cached
+        host, _, port = self.path.rpartition(":")
+        try:
+            upstream = socket.create_connection((host, int(port)), timeout=helpers.get_config("PROXY_TIMEOUT"))
+        except (OSError, ValueError) as e:
+            self.send_error(HTTPStatus.BAD_GATEWAY, str(e))
+            return
+        self.send_response(HTTPStatus.OK, "Connection Established")
+        self.end_headers()
+        self.close_connection = True
+        sockets = [self.connection, upstream]
+        try:
+            while True:
+                readable, _, errored = select.select(sockets, [], sockets, 60)
+                if errored or not readable:
+                    break
+                for sock in readable:
+                    data = sock.recv(64 * 1024)
+                    if not data:
+                        return
+                    (upstream if sock is self.connection else self.connection).sendall(data)
+        except OSError:
+            pass
+        finally:
+            upstream.close()
+
+    def do_GET(self):
+        self.forward()
+
+    def do_HEAD(self):
+        self.forward()
+
+    def do_POST(self):
+        self.forward()
+
+    def forward(self):
+        proxy = self.server.proxy
+        upstream_url = proxy.get_upstream(self.path)
+        if upstream_url and self.command == "GET":
+            cached = proxy.cache.get(upstream_url)
+            # Another worker may have evicted the body since
+            if cached and self.send_file(cached[0], cached[1]["headers"], cached[1]["size"]):
+                return
+
+        url = upstream_url or self.path
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_HEADERS and k.lower() not in ("host", "accept-encoding")}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        try:
+            response = requests.request(
+                self.command, url, headers=headers, data=body, stream=True,
+                allow_redirects=False, timeout=helpers.get_config("PROXY_TIMEOUT"),
+            )
+        except requests.RequestException as e:
+            self.send_error(HTTPStatus.BAD_GATEWAY, str(e))
+            return
+
+        with response:
+            cacheable = (
+                upstream_url and self.command == "GET" and response.status_code == 200
+                and "no-store" not in response.headers.get("Cache-Control", "")
+            )
+            replay = {k: v for k, v in response.headers.items() if k.lower() not in HOP_HEADERS and k.lower() not in ("content-length", "content-encoding")}
+            if not cacheable:
+                self.stream(response, replay)
+                return
+
+            # Download to a temporary file while hashing, then store it
+            digest = hashlib.sha256()
+            os.makedirs(proxy.cache.folder, exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(prefix="download_", dir=proxy.cache.folder)
+            try:
+                with os.fdopen(handle, "wb") as f:
+                    for chunk in response.iter_content(64 * 1024):
+                        digest.update(chunk)
+                        f.write(chunk)
+            except (OSError, requests.RequestException) as e:
+                os.remove(temp_path)
+                self.send_error(HTTPStatus.BAD_GATEWAY, str(e))
+                return
+        keep = {k: v for k, v in replay.items() if k.lower() in ("content-type", "last-modified", "etag", "cache-control")}
+        size = os.path.getsize(temp_path)
+        if size > helpers.get_config("PROXY_CACHE_MAX_SIZE"):
+            # Would be evicted right away, pass it through instead
+            logger.debug(f"Not caching {upstream_url}, {size} bytes is over the cache size")
+            try:
+                self.send_file(temp_path, replay, size)
+            finally:
+                os.remove(temp_path)
+            return
+        proxy.cache.put(upstream_url, temp_path, digest.hexdigest(), keep)
+        logger.debug(f"Cached {upstream_url}")
+        cached = proxy.cache.get(upstream_url)
+        if not cached or not self.send_file(cached[0], cached[1]["headers"], cached[1]["size"]):
+            self.send_error(HTTPStatus.BAD_GATEWAY, "Could not cache the response")
+
+    def stream(self, response, headers: dict):
+        """
+        Pass an upstream response through as it arrives, without holding the body in memory.
+        The upstream length is only kept when requests does not decode the body; otherwise
+        the body is sent chunked, or up to the end of the connection for HTTP/1.0 clients.
+        """
+        self.send_response(response.status_code)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        length = response.headers.get("Content-Length")
+        if self.command == "HEAD" or response.status_code in (HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED) or response.status_code < 200:
+            # A HEAD response announces the length of the body it leaves out
+            self.send_header("Content-Length", length if self.command == "HEAD" and length else "0")
+            self.end_headers()
+            return
+        chunked = False
+        if length and not response.headers.get("Content-Encoding"):
+            self.send_header("Content-Length", length)
+        elif self.request_version == "HTTP/1.1":
+            self.send_header("Transfer-Encoding", "chunked")
+            chunked = True
+        else:
+            self.close_connection = True
+        self.end_headers()
+        try:
+            for chunk in response.iter_content(64 * 1024):
+                if not chunk:
+                    continue
+                if chunked:
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                else:
+                    self.wfile.write(chunk)
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        except (OSError, requests.RequestException) as e:
+            # The status is already sent, closing the connection tells the client the body is cut short
+            logger.debug(f"Stopped passing {self.path} through: {e}")
+            self.close_connection = True
+
+    def send_file(self, path: str, headers: dict, size: int):
+        """
+        Send a body from disk.
+        :return: True if it was sent, False if the file is gone.
+        """
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return False
+        with f:
+            self.send_response(HTTPStatus.OK)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.connection.sendfile(f)
+        return True
+
+class CachingProxy:
+    """
+    An HTTP proxy for Chromium (--proxy-server) that keeps immutable assets on disk.
+    HTTPS cannot be cached without intercepting TLS, so the URLs of cacheable assets
+    (PROXY_CACHE_RULES) are rewritten to plain HTTP in the page; the proxy fetches
+    them over HTTPS and stores them. Everything else passes through unchanged.
+    """
+    def __init__(self):
+        self.httpd = None
+        self.cache = DiskCache(helpers.get_path(None, helpers.get_config("PATH_PROXY_CACHE")))
+
+    @property
+    def running(self):
+        return self.httpd is not None
+
+    @property
+    def address(self):
+        return f"127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        """
+        Start the proxy on a free local port.
+        :return: True if the proxy is running, False otherwise.
+        """
+        if self.running:
+            return True
+        try:
+            self.httpd = PlayerServer(("127.0.0.1", 0), ProxyHandler)
+        except OSError as e:
+            logger.error(f"Could not start the caching proxy: {e}")
+            return False
+        self.httpd.proxy = self
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        logger.info(f"Started caching proxy on {self.address}")
+        return True
+
+    def stop(self):
+        """Stop the proxy and save the cache index."""
+        if not self.running:
+            return
+        try:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        except Exception as e:
+            logger.debug(f"Suppressed error stopping the caching proxy: {e}")
+        self.httpd = None
+        self.cache.save()
+
+    def is_cacheable(self, host: str, path: str):
+        return any(host == rule_host and path.startswith(prefix) for rule_host, prefix in helpers.get_config("PROXY_CACHE_RULES"))
+
+    def get_upstream(self, url: str):
+        """
+        Get the HTTPS URL a rewritten asset request stands for.
+        :param url: Absolute URL requested through the proxy.
+        :return: The HTTPS URL if the request is for a cacheable asset, None otherwise.
+        """
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme != "http" or not self.is_cacheable(parsed.hostname or "", parsed.path):
+            return None
+        return urllib.parse.urlunsplit(("https",) + tuple(parsed)[1:])
+
+    def rewrite(self, text: str):
+        """
+        Point the cacheable asset URLs in a page script at the proxy by switching them to plain HTTP.
+        :param text: Script or markup.
+        :return: The rewritten text.
+        """
+        def replace(match):
+            parsed = urllib.parse.urlsplit(match.group(0))
+            if self.is_cacheable(parsed.hostname or "", parsed.path):
+                return "http://" + match.group(0)[len("https://"):]
+            return match.group(0)
+        return re.sub(r"https://[^\s\"'\\\\<>&?]+", replace, text)
@@ -0,0 +1,264 @@
+# Ring buffer capture module
+# Keeps one screen capture running per display, so starting a recording costs nothing and each one is cut out of the buffer
+
+import os
+import re
+import csv
+import time
+import shutil
+import threading
+import subprocess
+import helpers
+from modules.logger import logger
+
+# Start of an input in FFmpeg's log, e.g. "  Duration: N/A, start: 1729260000.123456, bitrate: N/A"
+INPUT_START_LINE = re.compile(r"Duration: .*?, start: ([\d.]+)")
+
+class RingBuffer:
+    """
+    A screen capture that keeps running between recordings, written in short intra-only
+    segments. Segments older than RING_BUFFER_DURATION are deleted unless a recording
+    still needs them. A recording is only a time range: when it stops, the segments it
+    spans are joined by stream copy, cut with concat inpoint/outpoint directives.
+    """
+    def __init__(self, capture):
+        # Native capture, which builds the capture commands
+        self.capture = capture
+        self.process = None
+        self.folder = None
+        self.segment_list = None
+        self.size = None
+        self.vcodec = None
+        self.source = None
+        # Wall time (ms) of the first captured frame, time 0 of the capture's timeline
+        self.origin = None
+        self.lock = threading.Lock()
+        # Start times (ms) of the recordings that are running
+        self.pins = []
+        self.removed = set()
+        self.output_thread = None
+        self.janitor = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, width: int, height: int, codec: dict):
+        """
+        Start the capture, unless it is already running at this size.
+        :param width: Width of the capture area.
+        :param height: Height of the capture area.
+        :param codec: Lossless codec settings from the native capture.
+        :return: True if the capture is running, False otherwise.
+        """
+        # A new browser plays into its own audio sink
+        source = self.capture.get_monitor()
+        if self.running and self.size == (width, height) and self.vcodec == codec["vcodec"] and self.source == source:
+            return True
+        self.stop()
+
+        self.folder = helpers.get_path(None, helpers.get_config("DEFAULT_OUTPUT_FILENAME"), f"ring_{os.getpid()}")
+        shutil.rmtree(self.folder, ignore_errors=True)
+        os.makedirs(self.folder, exist_ok=True)
+        self.segment_list = os.path.join(self.folder, "segments.csv")
+        self.removed = set()
+        container = os.path.splitext(codec["suffix"])[1].lstrip(".")
+        video_args = list(codec["video_args"])
+        if codec["vcodec"] == "libx264":
+            # Every frame is a keyframe, so a recording can start on any frame without re-encoding
+            video_args.extend(["-g", "1"])
+        settings = {
+            **codec,
+            # Frames are stamped with the wall clock when they are grabbed
+            "input_args": ["-use_wallclock_as_timestamps", "1"],
+            "video_args": video_args,
+            "output_args": [
+                "-f", "segment",
+                "-segment_time", str(helpers.get_config("RING_SEGMENT_DURATION")),
+                "-segment_format", "nut" if container == "nut" else "matroska",
+                "-reset_timestamps", "1",
+                "-segment_list", self.segment_list,
+                "-segment_list_type", "csv",
+            ],
+        }
+        command = self.capture.get_capture_command(os.path.join(self.folder, f"ring_%06d.{container}"), width, height, settings)
+        if not command:
+            return False
+
+        logger.debug(f"Ring buffer command: {' '.join(command)}")
+        self.process = subprocess.Popen(
+            command,
+            cwd=helpers.get_cwd(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            shell=False,
+            bufsize=1,
+            universal_newlines=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0,
+        )
+        # FFmpeg starts the timeline at the first frame's timestamp, which it reports as the input's start
+        self.origin = None
+        started = False
+        for line in self.process.stdout:
+            logger.debug(f"[ffmpeg_ring] {line.strip()}")
+            match = INPUT_START_LINE.search(line)
+            if match and self.origin is None:
+                self.origin = float(match.group(1)) * 1000
+            if "Output #0" in line:
+                started = True
+                break
+        if not started or self.origin is None:
+            logger.error("Failed to start the ring buffer capture")
+            self.stop()
+            return False
+        logger.info(f"Ring buffer timeline starts at {self.origin:.0f} ms, {helpers.get_timestamp() - self.origin:.0f} ms ago")
+
+        self.size = (width, height)
+        self.vcodec = codec["vcodec"]
+        self.source = source
+
+        def consume_output():
+            try:
+                for line in self.process.stdout:
+                    logger.debug(f"[ffmpeg_ring] {line.strip()}")
+            except Exception as e:
+                logger.debug(f"Ring buffer output consumer ended: {e}")
+
+        self.output_thread = threading.Thread(target=consume_output, daemon=True)
+        self.output_thread.start()
+        self.janitor = threading.Thread(target=self.clean, daemon=True)
+        self.janitor.start()
+        logger.info(f"Started ring buffer capture (PID: {self.process.pid}) in {self.folder}")
+        return True
+
+    def get_segments(self):
+        """
+        Get the closed segments of the capture.
+        :return: List of (path, start, end) tuples, with times in seconds on the capture's timeline.
+        """
+        if not self.segment_list or not os.path.exists(self.segment_list):
+            return []
+        with open(self.segment_list, "r", encoding="utf-8", newline="") as f:
+            content = f.read()
+        # Ignore a trailing entry that FFmpeg is still writing
+        lines = content.splitlines(keepends=True)
+        if lines and not lines[-1].endswith("\n"):
+            lines.pop()
+        segments = []
+        for row in csv.reader(lines):
+            if len(row) < 3:
+                continue
+            segments.append((os.path.join(self.folder, os.path.basename(row[0])), float(row[1]), float(row[2])))
+        return segments
+
+    def clean(self):
+        """Delete the segments nothing needs anymore, until the capture stops."""
+        keep = helpers.get_config("RING_BUFFER_DURATION")
+        while self.running:
+            with self.lock:
+                # Recordings keep every segment from their start on
+                cutoff = (helpers.get_timestamp() - self.origin) / 1000 - keep
+                if self.pins:
+                    cutoff = min(cutoff, (min(self.pins) - self.origin) / 1000)
+                for path, _, end in self.get_segments():
+                    if end < cutoff and path not in self.removed:
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                        self.removed.add(path)
+            time.sleep(1)
+
+    def pin(self, start: int):
+        """
+        Keep the segments of a recording that starts at a wall time.
+        :param start: Wall time in ms.
+        """
+        with self.lock:
+            self.pins.append(start)
+
+    def unpin(self, start: int):
+        with self.lock:
+            if start in self.pins:
+                self.pins.remove(start)
+
+    def cut(self, start: int, end: int, output: str):
+        """
+        Write the part of the capture between two wall times to a file, by stream copy.
+        :param start: Wall time in ms.
+        :param end: Wall time in ms.
+        :param output: Path of the recording.
+        :return: True if the recording was written, False otherwise.
+        """
+        start_s = max(0.0, (start - self.origin) / 1000)
+        end_s = (end - self.origin) / 1000
+
+        # The segment holding the end is closed at most one segment duration later
+        deadline = time.time() + helpers.get_config("RING_SEGMENT_DURATION") * 2 + 5
+        while True:
+            segments = self.get_segments()
+            if segments and segments[-1][2] >= end_s:
+                break
+            if not self.running or time.time() > deadline:
+                logger.error("The ring buffer did not record the end of the recording")
+                return False
+            time.sleep(0.1)
+
+        parts = [segment for segment in segments if segment[2] > start_s and segment[1] < end_s]
+        if not parts or parts[0][0] in self.removed:
+            logger.error("The start of the recording is no longer in the ring buffer")
+            return False
+
+        list_file = os.path.splitext(output)[0] + "_ring.txt"
+        with open(list_file, "w", encoding="utf-8") as f:
+            for index, (path, segment_start, segment_end) in enumerate(parts):
+                f.write(f"file '{path.replace(chr(92), '/')}'\n")
+                if index == 0 and start_s > segment_start:
+                    f.write(f"inpoint {start_s - segment_start:.6f}\n")
+                if index == len(parts) - 1 and end_s < segment_end:
+                    f.write(f"outpoint {end_s - segment_start:.6f}\n")
+
+        logger.info(f"Cutting {end_s - start_s:.3f}s from {len(parts)} ring buffer segments to: {output}")
+        result = helpers.create_logged_run(
+            [helpers.get_ffmpeg_path(), "-y", "-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", output],
+            process_name="ffmpeg_ring_cut",
+            capture_output=True,
+            text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0
+        )
+        try:
+            os.remove(list_file)
+        except OSError:
+            pass
+        if result.returncode != 0:
+            logger.error(f"Failed to cut the recording from the ring buffer: {result.stderr.strip()}")
+            return False
+        return True
+
+    def stop(self):
+        """Stop the capture, wait for its threads and remove its segments."""
+        if self.process:
+            try:
+                if self.process.poll() is None:
+                    self.process.stdin.write("q")
+                    self.process.stdin.flush()
+                self.process.wait(timeout=10)
+            except Exception:
+                try:
+                    self.process.kill()
+                    self.process.wait()
+                except Exception:
+                    pass
+            logger.debug("Stopped ring buffer capture")
+        # The janitor stops with the capture, a restarted ring must not share the folder with it
+        for thread in (self.janitor, self.output_thread):
+            if thread and thread is not threading.current_thread():
+                thread.join(timeout=5)
+        self.janitor = None
+        self.output_thread = None
+        self.process = None
+        if self.folder:
+            shutil.rmtree(self.folder, ignore_errors=True)
+        self.size = None
+        self.pins = []
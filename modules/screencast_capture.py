@@ -0,0 +1,270 @@
+# Screencast capture module
+# Records the frames the browser paints through Chrome DevTools, so capture needs no screen grab and no shared display
+
+import json
+import time
+import base64
+import threading
+import subprocess
+import urllib.request
+import websocket
+import helpers
+from modules import benchmark
+from modules.logger import logger
+
+class Capture:
+    """
+    Captures the page of the browser the navigator drives with Page.startScreencast.
+    Chromium sends a JPEG with a timestamp every time the page is painted; each frame is
+    repeated until the timestamp of the next one, so FFmpeg gets a constant frame rate
+    with every frame at the moment it was painted. The viewport is set to the capture
+    size, so the capture does not depend on the size of a monitor.
+    Sound is recorded by the same FFmpeg process from the system audio source.
+    """
+    def __init__(self, browser):
+        self.browser = browser
+        self.start_time = None
+        self.end_time = None
+        self.startup_delay = None
+        self.ended_delay = None
+        self.filename = None
+        self.process = None
+        self.socket = None
+        self.reader = None
+        self.ticker = None
+        self.message_id = 0
+        self.send_lock = threading.Lock()
+        self.frame_lock = threading.Lock()
+        self.first_frame = threading.Event()
+        self.stopping = threading.Event()
+        # Latest frame, wall time of the first written frame and number of frames written
+        self.frame = None
+        self.origin = None
+        self.written = 0
+        self.fps = helpers.get_config("SCREENCAST_FPS")
+
+    def get_websocket_url(self):
+        """
+        Get the DevTools address of the page the browser shows.
+        :return: WebSocket URL of the page target.
+        :raises RuntimeError: If the browser does not expose a page target.
+        """
+        address = self.browser.driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        with urllib.request.urlopen(f"http://{address}/json", timeout=5) as response:
+            targets = json.load(response)
+        for target in targets:
+            if target.get("type") == "page" and target.get("webSocketDebuggerUrl"):
+                return target["webSocketDebuggerUrl"]
+        raise RuntimeError("The browser has no page to capture")
+
+    def send(self, method: str, params: dict | None = None):
+        """Send a DevTools command without waiting for its result."""
+        with self.send_lock:
+            self.message_id += 1
+            self.socket.send(json.dumps({"id": self.message_id, "method": method, "params": params or {}}))
+
+    def write_until(self, until: float):
+        """
+        Repeat the latest frame for every frame slot before a wall time.
+        Must be called with frame_lock held.
+        :param until: Wall time in seconds.
+        """
+        if self.origin is None or self.frame is None:
+            return
+        try:
+            while self.origin + self.written / self.fps < until:
+                self.process.stdin.write(self.frame)
+                self.written += 1
+        except OSError as e:
+            if not self.stopping.is_set():
+                logger.error(f"Screencast encoder stopped accepting frames: {e}")
+            self.stopping.set()
+
+    def receive(self):
+        """Read screencast frames until the connection closes."""
+        while True:
+            try:
+                message = json.loads(self.socket.recv())
+            except (websocket.WebSocketException, OSError, ValueError):
+                break
+            if message.get("method") != "Page.screencastFrame":
+                continue
+            params = message["params"]
+            try:
+                # Chromium sends the next frame once this one is acknowledged
+                self.send("Page.screencastFrameAck", {"sessionId": params["sessionId"]})
+            except (websocket.WebSocketException, OSError):
+                break
+            timestamp = params.get("metadata", {}).get("timestamp") or time.time()
+            data = base64.b64decode(params["data"])
+            with self.frame_lock:
+                # The previous frame was on screen until this one was painted
+                self.write_until(timestamp)
+                self.frame = data
+            self.first_frame.set()
+
+    def tick(self):
+        """Keep writing the latest frame while the page is not repainted, so the audio never waits for video."""
+        delay = helpers.get_config("SCREENCAST_DELAY")
+        while not self.stopping.wait(delay / 2):
+            with self.frame_lock:
+                # Frames painted in the last moments may still be on their way
+                self.write_until(time.time() - delay)
+
+    def start(self, output: str, width: int, height: int):
+        """
+        Start capturing the page.
+        :param output: Path of the output video.
+        :param width: Width of the capture.
+        :param height: Height of the capture.
+        :return: True if capture started successfully, False otherwise.
+        """
+        self.filename = output
+        self.frame = None
+        self.origin = None
+        self.written = 0
+        self.first_frame.clear()
+        self.stopping.clear()
+        offset = helpers.get_timestamp("Screencast starting")
+
+        audio_input = helpers.get_audio_input(self.browser.audio_source)
+        profile = benchmark.get_profile("encode", width, height)
+        command = helpers.build_encode_command(
+            input_path="-",
+            output_path=output,
+            width=width,
+            height=height,
+            crf=helpers.get_config("DIRECT_ENCODE_CRF"),
+            preset=profile["preset"] if profile else helpers.get_config("DIRECT_ENCODE_PRESET"),
+            input_args=(["-thread_queue_size", "1024", *audio_input] if audio_input else []) + ["-thread_queue_size", "1024", "-f", "image2pipe", "-framerate", str(self.fps)],
+            output_args=["-threads", str(profile["threads"])] if profile else None,
+        )
+        if not command:
+            logger.error("Unsupported OS for screencast capture")
+            return False
+
+        try:
+            # The page is laid out at the capture size, whatever the size of the screen
+            self.browser.driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {
+                "width": width, "height": height, "deviceScaleFactor": 1, "mobile": False,
+            })
+            self.socket = websocket.create_connection(self.get_websocket_url(), timeout=None, suppress_origin=True)
+        except Exception as e:
+            logger.error(f"Could not connect to the browser for screencast capture: {e}")
+            self.cleanup()
+            return False
+        self.reader = threading.Thread(target=self.receive, daemon=True)
+        self.reader.start()
+        self.send("Page.startScreencast", {
+            "format": "jpeg",
+            "quality": helpers.get_config("SCREENCAST_QUALITY"),
+            "maxWidth": width,
+            "maxHeight": height,
+            "everyNthFrame": 1,
+        })
+        # Chromium sends the current page right away
+        if not self.first_frame.wait(helpers.get_config("SCREENCAST_START_TIMEOUT")):
+            logger.error("The browser did not send a screencast frame")
+            self.cleanup()
+            return False
+
+        logger.info(f"Starting screencast capture at {self.fps} fps to: {output}")
+        self.process = subprocess.Popen(
+            command,
+            cwd=helpers.get_cwd(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            shell=False,
+            creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0,
+        )
+        # The audio source is input #0 and starts recording when FFmpeg opens it, which is when
+        # video time 0 has to be. The frame input is only opened once frames are written.
+        opened = False
+        for line in self.process.stdout:
+            line = line.decode("utf-8", errors="replace").strip()
+            logger.debug(f"[ffmpeg_screencast] {line}")
+            if line.startswith("Input #0"):
+                opened = True
+                break
+        if not opened:
+            logger.error("The screencast encoder could not open the audio source")
+            self.cleanup()
+            return False
+        with self.frame_lock:
+            self.origin = time.time()
+
+        def consume_output():
+            for line in self.process.stdout:
+                logger.debug(f"[ffmpeg_screencast] {line.decode('utf-8', errors='replace').strip()}")
+
+        threading.Thread(target=consume_output, daemon=True).start()
+        self.ticker = threading.Thread(target=self.tick, daemon=True)
+        self.ticker.start()
+
+        self.start_time = helpers.get_timestamp("Screencast started")
+        self.startup_delay = self.start_time - offset
+        logger.info(f"Screencast capture started (startup delay: {self.startup_delay}ms)")
+        return True
+
+    def stop(self):
+        """
+        Stop capturing and finish the video.
+        :return: True if the video was written, False otherwise.
+        """
+        if not self.process:
+            logger.error("No screencast capture to stop")
+            return False
+
+        offset = helpers.get_timestamp("Screencast stopping")
+        try:
+            self.send("Page.stopScreencast")
+        except (websocket.WebSocketException, OSError):
+            pass
+        with self.frame_lock:
+            self.write_until(time.time())
+            self.stopping.set()
+        self.ticker.join()
+        logger.info(f"Screencast wrote {self.written} frames ({self.written / self.fps:.1f}s)")
+
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            returncode = self.process.wait(timeout=helpers.get_config("SCREENCAST_STOP_TIMEOUT"))
+        except subprocess.TimeoutExpired:
+            logger.error("The screencast encoder did not finish, terminating...")
+            self.process.terminate()
+            returncode = self.process.wait()
+        self.process = None
+        self.end_time = helpers.get_timestamp("Screencast ended")
+        self.ended_delay = self.end_time - offset
+        self.cleanup()
+
+        if returncode != 0:
+            logger.error(f"Screencast encoder failed (exit code {returncode})")
+            return False
+        logger.info(f"Capture stopped successfully (shutdown delay: {self.ended_delay}ms)")
+        return True
+
+    def cleanup(self):
+        """Close the DevTools connection and the encoder, and give the page its own size back."""
+        self.stopping.set()
+        if self.socket:
+            try:
+                self.socket.close()
+            except Exception:
+                pass
+            self.socket = None
+        if self.process and self.process.poll() is None:
+            try:
+                self.process.kill()
+                self.process.wait()
+            except Exception:
+                pass
+            self.process = None
+        try:
+            self.browser.driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+        except Exception:
+            pass
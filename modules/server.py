@@ -1,25 +1,324 @@
 from modules.logger import logger
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from http import HTTPStatus
+import email.utils
+import mimetypes
 import helpers
+import shutil
+import gzip
+import io
+import os
+import re
 import threading
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Single byte range, e.g. "bytes=0-1023", "bytes=1024-" or "bytes=-512"
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Content types worth compressing; SWFs and images are compressed already
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml")
+
+class CachedAsset:
+    """A file held in memory, with its compressed variants."""
+    def __init__(self, path: str, stat, data: bytes):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mtime_ns = stat.st_mtime_ns
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        # Content-Encoding -> body
+        self.variants = {"identity": data}
+        if self.content_type.startswith(COMPRESSIBLE_TYPES) and data:
+            self.variants["gzip"] = gzip.compress(data, compresslevel=9)
+            if brotli:
+                self.variants["br"] = brotli.compress(data)
+
+    def is_current(self, stat):
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+class AssetCache:
+    """
+    Keeps the files of the server folder in memory. Every request checks the
+    file's size and modification time, so changed files are reloaded.
+    Files over SERVER_CACHE_MAX_FILE_SIZE are not held and go out with sendfile.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self.assets = {}
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def preload(self):
+        """Load every file of the server folder."""
+        count = 0
+        for folder, _, files in os.walk(self.root):
+            for name in files:
+                if self.get(os.path.join(folder, name)):
+                    count += 1
+        logger.debug(f"Preloaded {count} player files ({self.total / (1024*1024):.1f} MB)")
+
+    def get(self, path: str):
+        """
+        Get a cached file, loading or reloading it as needed.
+        :param path: Path of the file.
+        :return: CachedAsset, or None if the file does not exist or is not cached.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            asset = self.assets.get(path)
+            if asset and asset.is_current(stat):
+                return asset
+        if not os.path.isfile(path) or stat.st_size > helpers.get_config("SERVER_CACHE_MAX_FILE_SIZE"):
+            return None
+        try:
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                data = f.read()
+        except OSError:
+            return None
+        asset = CachedAsset(path, stat, data)
+        with self.lock:
+            old = self.assets.pop(path, None)
+            if old:
+                self.total -= old.size
+            if self.total + asset.size > helpers.get_config("SERVER_CACHE_MAX_SIZE"):
+                return None
+            self.assets[path] = asset
+            self.total += asset.size
+        if old:
+            logger.debug(f"Reloaded changed player file {path}")
+        return asset
+
 class QuietHandler(SimpleHTTPRequestHandler):
+    """
+    Serves the player files over HTTP/1.1 keep-alive, with validators
+    (ETag, Last-Modified), Cache-Control and single byte ranges.
+    """
+    protocol_version = "HTTP/1.1"
+
     def log_message(self, format, *args):
         pass  # Suppress logging
 
+    def get_etag(self, stat):
+        # Strong validator: changes with the file's size or modification time
+        return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+    def is_not_modified(self, etag: str, mtime: float):
+        """Check the request's conditional headers against the file."""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            return since is not None and int(mtime) <= since.timestamp()
+        return False
+
+    def get_range(self, size: int):
+        """
+        Parse the Range header for a file.
+        :return: Tuple (start, end) with an inclusive end, None to send the whole file,
+                 or False if the range cannot be satisfied.
+        """
+        header = self.headers.get("Range")
+        if not header:
+            return None
+        # A range only applies to the version of the file the client already has
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range != self.etag:
+            return None
+        match = RANGE_HEADER.match(header.strip())
+        if not match:
+            # Multiple or non-byte ranges, send the whole file
+            return None
+        first, last = match.groups()
+        if not first and not last:
+            return None
+        if not first:
+            # The last N bytes
+            length = int(last)
+            if length == 0:
+                return False
+            return (max(0, size - length), size - 1)
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or end < start:
+            return False
+        return (start, end)
+
+    def send_head(self):
+        # Handlers live as long as the connection, so clear the previous request's range
+        self.remaining = None
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) or path.endswith("/"):
+            # Directory redirects and listings
+            return super().send_head()
+
+        cache = getattr(self.server, "cache", None)
+        asset = cache.get(path) if cache else None
+        if asset:
+            return self.send_cached(asset)
+
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        try:
+            stat = os.fstat(f.fileno())
+            self.etag = self.get_etag(stat)
+            if self.is_not_modified(self.etag, stat.st_mtime):
+                f.close()
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_validators(stat.st_mtime)
+                self.end_headers()
+                return None
+
+            size = stat.st_size
+            byte_range = self.get_range(size)
+            if byte_range is False:
+                f.close()
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+
+            if byte_range:
+                start, end = byte_range
+                f.seek(start)
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.remaining = end - start + 1
+            else:
+                self.send_response(HTTPStatus.OK)
+                self.remaining = size
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Content-Length", str(self.remaining))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_validators(stat.st_mtime)
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
+    def get_encoding(self, asset: CachedAsset):
+        """Pick the smallest variant of a cached file the client accepts."""
+        accepted = {}
+        for part in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = part.strip().partition(";")
+            quality = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    pass
+            accepted[name.strip().lower()] = quality
+        for encoding in ("br", "gzip"):
+            if encoding in asset.variants and accepted.get(encoding, 0) > 0:
+                return encoding
+        return "identity"
+
+    def send_cached(self, asset: CachedAsset):
+        """Send the headers for a file from the asset cache and return its body."""
+        # Ranges are only served from the uncompressed file
+        encoding = "identity" if self.headers.get("Range") else self.get_encoding(asset)
+        tag = f"{asset.size:x}-{asset.mtime_ns:x}"
+        # Every variant is a different representation, so it gets its own strong validator
+        self.etag = f'"{tag}"' if encoding == "identity" else f'"{tag}-{encoding}"'
+        if self.is_not_modified(self.etag, asset.mtime):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_validators(asset.mtime)
+            if len(asset.variants) > 1:
+                self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return None
+
+        body = asset.variants[encoding]
+        byte_range = self.get_range(len(body)) if encoding == "identity" else None
+        if byte_range is False:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{len(body)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+        if byte_range:
+            start, end = byte_range
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+            body = body[start:end + 1]
+        else:
+            self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", asset.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        if len(asset.variants) > 1:
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_validators(asset.mtime)
+        self.end_headers()
+        return io.BytesIO(body)
+
+    def send_validators(self, mtime: float):
+        self.send_header("ETag", self.etag)
+        self.send_header("Last-Modified", self.date_time_string(mtime))
+        self.send_header("Cache-Control", f"public, max-age={helpers.get_config('SERVER_CACHE_MAX_AGE')}")
+
+    def copyfile(self, source, outputfile):
+        # Only send the requested range
+        remaining = self.remaining
+        if remaining is None:
+            shutil.copyfileobj(source, outputfile)
+            return
+        if isinstance(source, io.BufferedReader):
+            # Let the kernel copy the file to the socket (sendfile where available)
+            self.connection.sendfile(source, source.tell(), remaining)
+            return
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+class PlayerServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # On Windows SO_REUSEADDR lets a second server take over a port that is in use
+    allow_reuse_address = not helpers.os_is_windows()
+
 class Server:
     def __init__(self, host: str | None = None, port: int | None = None):
         self.prot = helpers.get_config("SERVER_PROTOCOL", "http")
         self.host = helpers.get_config("SERVER_HOST", host)
-        self.port = helpers.get_config("SERVER_PORT", port)
+        self.port = port or helpers.get_param("server_port") or helpers.get_config("SERVER_PORT")
         self.path = helpers.get_path(helpers.get_app_folder(), helpers.get_config("DEFAULT_SERVER_FILENAME"))
+        self.cache = helpers.get_param("server_cache")
 
     def hostname(self):
         return f"{self.prot}://{self.host}:{self.port}"
 
     def start(self):
         handler = lambda *args, **kwargs: QuietHandler(*args, directory=self.path, **kwargs)
-        self.httpd = HTTPServer((self.host, self.port), handler)
+        self.httpd = PlayerServer((self.host, self.port), handler)
+        self.httpd.cache = None
+        if self.cache:
+            self.httpd.cache = AssetCache(self.path)
+            # Fill the cache while the browser starts; requests load what is missing themselves
+            threading.Thread(target=self.httpd.cache.preload, daemon=True).start()
         logger.debug(f"Starting server on {self.hostname()} serving {self.path}")
         self.server_thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
         self.server_thread.start()
@@ -35,4 +334,4 @@ class Server:
                 self.server_thread.join()
         except Exception as e:
             logger.debug(f"Suppressed error during server stop: {e}")
-        logger.debug("Server stopped")
\ No newline at end of file
+        logger.debug("Server stopped")
@@ -0,0 +1,111 @@
+# Split export module (Linux only)
+# Records the time ranges of one movie on parallel workers and joins the parts, so a long movie takes a fraction of its length
+
+import os
+import shutil
+import helpers
+from modules import probe
+from modules.logger import logger
+from modules.output import structured_output
+from modules.workers import WorkerPool
+
+def get_ranges(duration: float, count: int):
+    """
+    Split a movie into time ranges of equal length.
+    :param duration: Length of the movie in seconds.
+    :param count: Number of ranges.
+    :return: List of (start, end) tuples; the last range has no end and runs until the movie does.
+    """
+    length = duration / count
+    ranges = [(round(i * length, 3), round((i + 1) * length, 3)) for i in range(count)]
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+class Split:
+    """
+    Exports one movie as several parts recorded at the same time. Every worker seeks the
+    player to the start of its range, records until a little past its end and cuts the
+    overlap; the parts are then joined by the controller's editor like any other clips.
+    """
+    def __init__(self, controller, count: int):
+        self.controller = controller
+        self.count = count
+
+    def get_jobs(self, folder: str):
+        """
+        Get the worker jobs of the parts.
+        :param folder: Folder the parts are written to.
+        :return: List of (job dict, part path) tuples.
+        """
+        controller = self.controller
+        duration = helpers.get_param("movie_duration")
+        jobs = []
+        for index, (start, end) in enumerate(get_ranges(duration, self.count)):
+            path = os.path.join(folder, f"part_{index:03d}{helpers.get_config('DEFAULT_OUTPUT_EXTENSION')}")
+            job = {
+                "id": f"part_{index}",
+                "service": controller.service,
+                "movie_id": controller.movieid,
+                "owner_id": controller.ownerid,
+                "aspect_ratio": controller.aspect_ratio,
+                "resolution": controller.resolution,
+                "output_path": path,
+                "use_outro": False,
+                "range_start": start,
+            }
+            if end is not None:
+                job["range_end"] = end
+            jobs.append((job, path))
+        return jobs
+
+    def check_parts(self, jobs):
+        """
+        Check that every part is as long as its range, so no stretch of the movie goes missing in the join.
+        :param jobs: Jobs from get_jobs.
+        :return: True if every part covers its range, False otherwise.
+        """
+        tolerance = helpers.get_config("SPLIT_TOLERANCE")
+        for job, path in jobs:
+            length = probe.get_duration(probe.probe(path)) if os.path.exists(path) else None
+            if length is None:
+                logger.error(f"Part {job['id']} was not written")
+                return False
+            if "range_end" in job and length < job["range_end"] - job["range_start"] - tolerance:
+                logger.error(f"Part {job['id']} is {length:.3f}s long, its range is {job['range_end'] - job['range_start']:.3f}s")
+                return False
+        return True
+
+    def run(self):
+        """
+        Record the parts and add them to the controller's editor, in order.
+        :return: True if every part was recorded, False otherwise.
+        """
+        controller = self.controller
+        if not helpers.get_param("movie_duration"):
+            logger.error("Split exports need the length of the movie (--movie-duration)")
+            return False
+        if controller.legacy:
+            logger.error(f"{controller.svr_name} cannot be split, its player cannot seek before it starts")
+            return False
+        if not controller.auto_edit:
+            logger.error("Split exports need automated editing to join the parts")
+            return False
+
+        # Named per process, like the intermediate recordings
+        folder = helpers.get_path(None, helpers.get_config("DEFAULT_OUTPUT_FILENAME"), f"{controller.readable_filename}_{os.getpid()}_parts")
+        os.makedirs(folder, exist_ok=True)
+        jobs = self.get_jobs(folder)
+        logger.info(f"Splitting the movie into {self.count} parts")
+        structured_output.progress(f"Recording {self.count} parts", stage="split")
+
+        # The pool runs its own player server on the same port
+        controller.stop_server()
+        if not WorkerPool(self.count).run(job for job, _ in jobs) or not self.check_parts(jobs):
+            logger.error("Not every part of the movie was recorded")
+            shutil.rmtree(folder, ignore_errors=True)
+            return False
+
+        for _, path in jobs:
+            controller.editor.add_clip(path, len(controller.editor.clips))
+        logger.info(f"Recorded {self.count} parts in {folder}")
+        return True
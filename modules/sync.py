@@ -0,0 +1,152 @@
+# A/V sync module
+# Finds the start marker the player page flashes in a recording, so trims follow the captured content instead of clock deltas
+
+import re
+import subprocess
+import helpers
+from modules import probe
+from modules.logger import logger
+
+# Analysis size and whiteness thresholds: a frame counts as the marker when almost all of it is near white
+ANALYSIS_WIDTH = 160
+MARKER_AMOUNT = 98
+MARKER_THRESHOLD = 32
+
+# blackframe output line, e.g. "[Parsed_blackframe_2 @ 0x...] frame:12 pblack:100 pts:6144 t:0.400000 ..."
+BLACKFRAME_LINE = re.compile(r"frame:(\d+)\s+pblack:\d+.*?\st:([\d.]+)")
+
+def get_frame_duration(path: str):
+    """
+    Get the duration of one frame of a video.
+    :param path: Path to the video.
+    :return: Frame duration in seconds (1/30 if the frame rate is unknown).
+    """
+    stream = probe.get_stream(probe.probe(path), "video")
+    try:
+        numerator, denominator = (int(n) for n in stream["r_frame_rate"].split("/"))
+        if numerator and denominator:
+            return denominator / numerator
+    except (TypeError, KeyError, ValueError):
+        pass
+    return 1 / 30
+
+def find_marker(path: str, estimate: float, window: float = None):
+    """
+    Find the start marker in a recording.
+    The marker is a white overlay shown for SYNC_MARKER_DURATION ms the moment the player starts;
+    it is found by running blackframe on the negated, downscaled video around the estimated start.
+    :param path: Path to the recording.
+    :param estimate: Estimated marker time in seconds.
+    :param window: Seconds to search on each side of the estimate (SYNC_SEARCH_WINDOW if not given).
+    :return: Tuple (start, end) of the marker in seconds, or None if it was not found.
+    """
+    ffmpeg = helpers.get_ffmpeg_path()
+    if not ffmpeg:
+        logger.error("Unsupported OS for marker detection.")
+        return None
+    if window is None:
+        window = helpers.get_config("SYNC_SEARCH_WINDOW")
+    offset = max(0.0, estimate - window)
+
+    try:
+        result = helpers.create_logged_run(
+            [
+                ffmpeg,
+                "-hide_banner",
+                "-nostats",
+                "-ss", f"{offset:.3f}",
+                "-t", f"{estimate + window - offset:.3f}",
+                "-i", path,
+                "-an",
+                "-vf", f"scale={ANALYSIS_WIDTH}:-2,negate,blackframe=amount={MARKER_AMOUNT}:threshold={MARKER_THRESHOLD}",
+                "-f", "null", "-",
+            ],
+            log_output=False,
+            capture_output=True,
+            text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if helpers.os_is_windows() else 0
+        )
+    except Exception as e:
+        logger.error(f"Marker detection failed: {e}")
+        return None
+    if result.returncode != 0:
+        logger.error(f"Marker detection failed: {result.stderr.strip()}")
+        return None
+
+    frames = [(int(m.group(1)), float(m.group(2))) for m in BLACKFRAME_LINE.finditer(result.stderr)]
+    if not frames:
+        logger.info(f"No start marker found in {path} around {estimate:.3f}s")
+        return None
+
+    # Group the white frames into runs of consecutive frames
+    runs = []
+    for frame, time in frames:
+        if runs and frame == runs[-1][1] + 1:
+            runs[-1][1:] = [frame, time]
+        else:
+            runs.append([time, frame, time])
+
+    frame_duration = get_frame_duration(path)
+    duration = helpers.ms_to_s(helpers.get_config("SYNC_MARKER_DURATION"))
+    # Captured frames fall anywhere on the marker's edges
+    tolerance = max(2 * frame_duration, helpers.ms_to_s(helpers.get_config("SYNC_MARKER_TOLERANCE")))
+    for start, _, last in runs:
+        end = last + frame_duration
+        if end - start < duration - tolerance:
+            # Too short for the marker, a white flash in the page
+            continue
+        if end - start > duration + tolerance:
+            # A light opening scene continues the marker, cut where the marker ends
+            logger.info(f"White stretch of {end - start:.3f}s at {offset + start:.3f}s is longer than the marker, cutting after {duration:.3f}s")
+            end = start + duration
+        logger.info(f"Found start marker in {path} at {offset + start:.3f}s - {offset + end:.3f}s")
+        return (offset + start, offset + end)
+    logger.info(f"No white run as long as the start marker in {path} around {estimate:.3f}s")
+    return None
+
+def get_latency():
+    """
+    Get the calibrated latency between the player's start event and the captured start.
+    :return: Latency in ms (0 if not calibrated yet).
+    """
+    return helpers.load("sync_latency", 0) or 0
+
+def calibrate(measured: float):
+    """
+    Store a latency measurement, averaged with the earlier ones.
+    :param measured: Marker time minus the clock estimate, in ms.
+    """
+    latency = get_latency()
+    # Weighted towards the history so a single odd export does not swing the correction
+    latency = measured if not latency else latency * 0.75 + measured * 0.25
+    helpers.save("sync_latency", round(latency, 1))
+    logger.debug(f"Start latency: measured {measured:.1f} ms, calibrated {latency:.1f} ms")
+
+def get_marker_script(on_start: bool):
+    """
+    Get the page script that shows the start marker.
+    It defines window.goexportMarker(done), which covers the page in white for
+    SYNC_MARKER_DURATION ms and then calls done.
+    :param on_start: Also show the marker when the player starts, pausing the player until it is gone
+        (for captures that are already running when the player starts).
+    :return: JavaScript source, to be evaluated before the page's own scripts.
+    """
+    return (
+        "(function () {"
+        " if (window.top !== window) return;"
+        f" var duration = {int(helpers.get_config('SYNC_MARKER_DURATION'))};"
+        " window.goexportMarker = function (done) {"
+        "  var marker = document.createElement(\"div\");"
+        "  marker.style.cssText = \"position:fixed;left:0;top:0;width:100vw;height:100vh;background:#fff;z-index:2147483647\";"
+        "  document.documentElement.appendChild(marker);"
+        "  setTimeout(function () { marker.remove(); if (done) done(); }, duration);"
+        " };"
+        + (
+        " window.addEventListener(\"goexport:startRecord\", function () {"
+        "  var obj = document.getElementById(\"obj\");"
+        "  try { obj.pause(); } catch (e) {}"
+        "  window.goexportMarker(function () { try { obj.play(); } catch (e) {} });"
+        " });"
+        if on_start else "")
+        + "})();"
+    )
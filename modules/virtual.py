@@ -0,0 +1,101 @@
+# Virtual display and audio module (Linux only)
+# Gives every export worker its own X server and PulseAudio sink, so several exports can be captured at once
+
+import os
+import subprocess
+import helpers
+from modules.logger import logger
+
+class VirtualDisplay:
+    """
+    A headless X server (Xvfb) on its own display number.
+    """
+    def __init__(self, number: int, width: int, height: int, depth: int = 24):
+        self.number = number
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.process = None
+
+    @property
+    def name(self):
+        return f":{self.number}"
+
+    def start(self):
+        """
+        Start the X server and wait until it accepts connections.
+        :return: True if the display is ready, False otherwise.
+        """
+        xvfb = helpers.search_path("Xvfb")
+        if not xvfb:
+            logger.error("Xvfb is not installed")
+            return False
+        socket = f"/tmp/.X11-unix/X{self.number}"
+        if os.path.exists(socket):
+            logger.error(f"Display {self.name} is already in use")
+            return False
+
+        self.process = helpers.create_logged_popen(
+            [xvfb, self.name, "-screen", "0", f"{self.width}x{self.height}x{self.depth}", "-nolisten", "tcp", "-ac"],
+            process_name=f"xvfb_{self.number}",
+            stdin=subprocess.DEVNULL,
+        )
+        if not helpers.wait_for(True, lambda: os.path.exists(socket) or self.process.poll() is not None, reason=f"display {self.name}", timeout=10) or self.process.poll() is not None:
+            logger.error(f"Xvfb failed to start on display {self.name}")
+            self.stop()
+            return False
+        logger.info(f"Started virtual display {self.name} ({self.width}x{self.height})")
+        return True
+
+    def stop(self):
+        """Stop the X server."""
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            logger.info(f"Stopped virtual display {self.name}")
+        self.process = None
+
+class NullSink:
+    """
+    A PulseAudio null sink. Audio played into it can be recorded from its monitor source.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.module = None
+
+    @property
+    def monitor(self):
+        return f"{self.name}.monitor"
+
+    def start(self):
+        """
+        Load the null sink.
+        :return: True if the sink was created, False otherwise.
+        """
+        pactl = helpers.search_path("pactl")
+        if not pactl:
+            logger.error("pactl is not installed")
+            return False
+        output = helpers.try_command(
+            pactl, "load-module", "module-null-sink",
+            f"sink_name={self.name}",
+            f"sink_properties=device.description={self.name}",
+            return_output=True
+        )
+        if not output:
+            logger.error(f"Could not create PulseAudio sink {self.name}")
+            return False
+        self.module = output.strip()
+        logger.info(f"Created PulseAudio sink {self.name} (module {self.module})")
+        return True
+
+    def stop(self):
+        """Unload the null sink."""
+        if self.module:
+            helpers.try_command(helpers.search_path("pactl") or "pactl", "unload-module", self.module)
+            logger.info(f"Removed PulseAudio sink {self.name}")
+        self.module = None
@@ -0,0 +1,242 @@
+# Parallel export module (Linux only)
+# Runs batch jobs across several worker processes, each with its own display, audio sink and browser
+
+import os
+import sys
+import json
+import queue
+import threading
+import subprocess
+import helpers
+from modules.logger import logger
+from modules.output import structured_output
+from modules.virtual import VirtualDisplay, NullSink
+from modules.server import Server
+
+# Events that end a job in a worker
+JOB_END_EVENTS = ("job_completed", "job_failed", "job_skipped")
+
+class Worker:
+    """
+    One export worker: a GoExport process in batch mode reading jobs from STDIN,
+    pinned to its own virtual display and PulseAudio null sink.
+    """
+    def __init__(self, index: int, port: int):
+        self.index = index
+        width, height = helpers.get_config("WORKER_DISPLAY_SIZE")
+        self.display = VirtualDisplay(
+            helpers.get_config("WORKER_DISPLAY_BASE") + index,
+            width,
+            height,
+            helpers.get_config("WORKER_DISPLAY_DEPTH"),
+        )
+        # Named per process, two batch runs on one host must not share a sink
+        self.sink = NullSink(f"goexport_worker_{os.getpid()}_{index}")
+        # Port of the player server shared by every worker
+        self.port = port
+        self.process = None
+        self.reader = None
+        self.job = None
+
+    def get_command(self):
+        """
+        Get the command that starts the worker process.
+        The original arguments are passed on; the worker's own options come last, so they win.
+        """
+        if getattr(sys, "frozen", False):
+            command = [sys.executable]
+        else:
+            command = [sys.executable, os.path.abspath(sys.argv[0])]
+        return command + sys.argv[1:] + [
+            "--batch", "-",
+            "--workers", "0",
+            "--json",
+            "--no-input",
+            "--skip-resolution-check",
+            "--x11grab-display", self.display.name,
+            "--pulse-audio", self.sink.monitor,
+            "--server-port", str(self.port),
+        ]
+
+    def start(self, events: queue.Queue):
+        """
+        Start the display, the sink and the worker process.
+        :param events: Queue that receives (worker, event) tuples for every JSON event the worker emits.
+        :return: True if the worker started, False otherwise.
+        """
+        if not self.display.start():
+            return False
+        if not self.sink.start():
+            self.display.stop()
+            return False
+
+        env = dict(os.environ)
+        env["DISPLAY"] = self.display.name
+        # Chromium plays into the worker's own sink
+        env["PULSE_SINK"] = self.sink.name
+        self.process = subprocess.Popen(
+            self.get_command(),
+            cwd=helpers.get_cwd(),
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        logger.info(f"Started worker {self.index} (PID: {self.process.pid}) on {self.display.name}")
+
+        def read():
+            for line in self.process.stdout:
+                line = line.strip()
+                if not line.startswith("{"):
+                    continue
+                try:
+                    events.put((self, json.loads(line)))
+                except ValueError:
+                    logger.debug(f"[worker {self.index}] {line}")
+            events.put((self, {"event": "worker_exited"}))
+
+        self.reader = threading.Thread(target=read, daemon=True)
+        self.reader.start()
+        return True
+
+    def submit(self, job: dict):
+        """Send a job to the worker."""
+        self.job = job
+        self.process.stdin.write(json.dumps(job) + "\n")
+        self.process.stdin.flush()
+
+    def stop(self):
+        """Let the worker finish, then remove its display and sink."""
+        if self.process:
+            try:
+                self.process.stdin.close()
+            except Exception:
+                pass
+            try:
+                self.process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"Worker {self.index} did not exit, terminating")
+                self.process.terminate()
+                self.process.wait()
+            self.process = None
+        self.sink.stop()
+        self.display.stop()
+
+class WorkerPool:
+    """
+    Runs batch jobs on several workers at once. Each job is handed to the next idle
+    worker, so long and short movies balance out across the pool.
+    """
+    def __init__(self, count: int):
+        self.count = count
+        self.workers = []
+        self.events = queue.Queue()
+        # One player server for the whole pool
+        self.server = None
+
+    def start(self):
+        """
+        Start the workers.
+        :return: True if at least one worker started, False otherwise.
+        """
+        if not helpers.os_is_linux():
+            logger.error("Parallel workers are only supported on Linux")
+            return False
+        self.server = Server()
+        try:
+            self.server.start()
+        except Exception as e:
+            # The workers start their own if they need one
+            logger.warning(f"Could not start the shared player server: {e}")
+            self.server = None
+        port = helpers.get_param("server_port") or helpers.get_config("SERVER_PORT")
+        for index in range(self.count):
+            worker = Worker(index, port)
+            if worker.start(self.events):
+                self.workers.append(worker)
+            else:
+                logger.error(f"Could not start worker {index}")
+        return bool(self.workers)
+
+    def stop(self):
+        """Stop every worker."""
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+        if self.server:
+            self.server.stop()
+            self.server = None
+
+    def run(self, jobs):
+        """
+        Run every job on the pool, forwarding each worker's job events with a "worker" field.
+        :param jobs: Iterable of job dicts.
+        :return: True if every job succeeded, False otherwise.
+        """
+        if not self.start():
+            self.stop()
+            return False
+
+        jobs = iter(jobs)
+        idle = list(self.workers)
+        busy = submitted = 0
+        exhausted = False
+        succeeded = failed = 0
+        try:
+            while True:
+                # Hand out jobs until the pool is full or there are no more
+                while idle and not exhausted:
+                    try:
+                        job = next(jobs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if not isinstance(job, dict):
+                        logger.error(f"Batch job {submitted} is not an object: {job}")
+                        structured_output.emit("job_failed", job_id=submitted, message="Invalid job")
+                        submitted += 1
+                        failed += 1
+                        continue
+                    job.setdefault("id", submitted)
+                    worker = idle.pop(0)
+                    worker.submit(job)
+                    submitted += 1
+                    busy += 1
+                if not busy:
+                    if not exhausted:
+                        logger.error("No workers left, the remaining jobs were not run")
+                        failed += 1
+                    break
+
+                worker, event = self.events.get()
+                name = event.pop("event", None)
+                if name == "worker_exited":
+                    if worker.job is not None:
+                        # The worker died in the middle of a job
+                        logger.error(f"Worker {worker.index} exited during job {worker.job.get('id')}")
+                        structured_output.emit("job_failed", job_id=worker.job.get("id"), message="Worker exited", worker=worker.index)
+                        worker.job = None
+                        busy -= 1
+                        failed += 1
+                    if worker in idle:
+                        idle.remove(worker)
+                    continue
+                if not name or not name.startswith("job_"):
+                    continue
+                event.pop("timestamp", None)
+                structured_output.emit(name, event, worker=worker.index)
+                if name in JOB_END_EVENTS:
+                    if name == "job_completed":
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    worker.job = None
+                    busy -= 1
+                    idle.append(worker)
+        finally:
+            self.stop()
+
+        logger.info(f"Parallel batch finished: {succeeded} succeeded, {failed} failed")
+        structured_output.emit("batch_completed", succeeded=succeeded, failed=failed)
+        return failed == 0